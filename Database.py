@@ -1,99 +1,304 @@
+import asyncio
 import datetime
+import json
+import threading
+import time
+from contextlib import contextmanager
 from typing import Any
 
-import psycopg2
 from psycopg2 import Error
+from psycopg2.extensions import cursor as PsycopgCursor
+from psycopg2.pool import ThreadedConnectionPool
 
+import metrics
+from distractors import DistractorSampler
+from topic_catalog import TopicCatalog
+from user_cache import UserCache
+from user_context import UserContext
 
-class Database:
-    def __init__(self, db_user: str, db_password: str, db_host: str, db_port: str, db_name: str):
+# Поля пользователя, которые можно изменить через update_user
+USER_FIELDS = {"state", "topic_id", "questions_number", "correct_answers_number", "last_repeat", "is_reminder_send"}
+
+
+class TimedCursor(PsycopgCursor):
+    # Курсор, который выводит запросы дольше slow_query_threshold секунд одной JSON-строкой
+    slow_query_threshold = None
+
+    def execute(self, query, vars=None):
+        started_at = time.perf_counter()
         try:
-            self.connection = psycopg2.connect(
+            return super().execute(query, vars)
+        finally:
+            duration = time.perf_counter() - started_at
+            if self.slow_query_threshold is not None and duration >= self.slow_query_threshold:
+                operation = metrics.current_operation() or 'unknown'
+                metrics.DB_SLOW_QUERIES.inc(operation)
+                print(json.dumps({
+                    "event": "slow_query",
+                    "method": operation,
+                    "duration_ms": round(duration * 1000, 1),
+                    "rows": self.rowcount,
+                    "query": " ".join(str(query).split())[:1000],
+                }, ensure_ascii=False))
+
+
+class Database:
+    def __init__(self, db_user: str, db_password: str, db_host: str, db_port: str, db_name: str,
+                 min_connections: int = 1, max_connections: int = 1, user_cache_size: int = 10000,
+                 user_cache_ttl: float = 300.0, user_cache_redis_url: str | None = None, topics_page_size: int = 10,
+                 slow_query_threshold: float | None = 0.1):
+        self.pool = None
+        # Запросы дольше порога (в секундах) выводятся в лог, None - не выводятся
+        self.slow_query_threshold = slow_query_threshold
+        # Ограничивает число одновременно занятых соединений: при исчерпании пула
+        # поток ждёт возврата соединения, а не получает PoolError
+        self.pool_semaphore = threading.BoundedSemaphore(max_connections)
+        # Индекс переводов для неправильных вариантов ответа, сбрасывается при изменении словаря
+        self.distractors = DistractorSampler(self.get_words_translations)
+        # Темы и клавиатура выбора темы, сбрасываются при добавлении темы
+        self.topics = TopicCatalog(self.get_topics, page_size=topics_page_size)
+        # Состояние и настройки пользователей: чтение из памяти, запись сразу в БД и в кеш
+        self.users = UserCache(max_size=user_cache_size, ttl=user_cache_ttl, redis_url=user_cache_redis_url)
+        try:
+            self.pool = ThreadedConnectionPool(
+                min_connections,
+                max_connections,
                 user=db_user,
                 password=db_password,
                 host=db_host,
                 port=db_port,
                 database=db_name
             )
-            self.cursor = self.connection.cursor()
 
         except(Exception, Error) as error:
             print("Ошибка при работе с БД. ", error)
 
     def __del__(self):
-        if self.cursor is not None:
-            self.cursor.close()
-        if self.connection is not None:
-            self.connection.close()
+        if self.pool is not None:
+            self.pool.closeall()
+
+    @contextmanager
+    def _cursor(self):
+        # Берёт соединение из пула на время одного вызова метода.
+        # Транзакция фиксируется при выходе из блока и откатывается при ошибке
+        # Ошибка учитывается в метриках метода, который выполняется в этом потоке
+        try:
+            with self.pool_semaphore:
+                connection = self.pool.getconn()
+                try:
+                    with connection.cursor(cursor_factory=TimedCursor) as cursor:
+                        cursor.slow_query_threshold = self.slow_query_threshold
+                        yield cursor
+                    connection.commit()
+                except BaseException:
+                    connection.rollback()
+                    raise
+                finally:
+                    self.pool.putconn(connection)
+        except Exception:
+            metrics.DB_METHOD_ERRORS.inc(metrics.current_operation() or 'unknown')
+            raise
 
     def add_user(self, user_id: int):
         try:
-            self.cursor.execute(f"SELECT id FROM topics WHERE user_id IS NULL")
-            topic = self.cursor.fetchone()
-            topic_id = None
-            if topic:
-                topic_id = topic[0]
+            with self._cursor() as cursor:
+                cursor.execute(f"SELECT id FROM topics WHERE user_id IS NULL")
+                topic = cursor.fetchone()
+                topic_id = None
+                if topic:
+                    topic_id = topic[0]
+
+                query = (f"INSERT INTO users (id, topic_id, questions_number, correct_answers_number) "
+                         f"VALUES (%(user_id)s, %(topic_id)s, %(questions_number)s, %(correct_answers_number)s)")
+                data = {
+                    "user_id": user_id,
+                    "topic_id": topic_id,
+                    "questions_number": 5,
+                    "correct_answers_number": 5,
+                }
+                cursor.execute(query, data)
+            self.users.invalidate(user_id)
+        except (Exception, Error) as error:
+            print("Ошибка при добавлении пользователя.", error)
+
+    def _get_user(self, user_id: int) -> dict | None:
+        # Строка пользователя из кеша, при промахе - из БД
+        user = self.users.get(user_id)
+        if user is not None:
+            return user
+
+        version = self.users.get_version()
+        query = (f"SELECT state, topic_id, questions_number, correct_answers_number "
+                 f"FROM users WHERE id = %(user_id)s")
+        data = {"user_id": user_id}
+        with self._cursor() as cursor:
+            cursor.execute(query, data)
+            res = cursor.fetchone()
+        if res is None:
+            return None
+
+        user = {
+            "state": res[0],
+            "topic_id": res[1],
+            "questions_number": res[2],
+            "correct_answers_number": res[3]
+        }
+        self.users.set(user_id, user, version)
+        return user
+
+    def _query_user_context(self, cursor, user_id: int, fields: dict,
+                            statistics: bool = False) -> UserContext | None:
+        # Изменяет поля пользователя (если они переданы) и возвращает его контекст одним запросом
+        unknown_fields = set(fields) - USER_FIELDS
+        if unknown_fields:
+            raise ValueError(f"Неизвестные поля пользователя: {', '.join(unknown_fields)}")
+
+        columns = ("users.state, users.topic_id, topics.title, topics.description, users.questions_number, "
+                   "users.correct_answers_number, users.last_repeat, users.is_reminder_send")
+        if statistics:
+            # Счётчики поддерживаются триггерами (migrations/003_statistics_counters.sql)
+            columns += (", (SELECT COALESCE(SUM(learned_words_number), 0) FROM user_topic_statistics "
+                        "WHERE user_topic_statistics.user_id = users.id)"
+                        ", topics.words_number")
+        else:
+            columns += ", NULL, NULL"
+
+        if fields:
+            assignments = ", ".join(f"{field} = %({field})s" for field in fields)
+            query = (f"WITH updated AS (UPDATE users SET {assignments} WHERE id = %(user_id)s RETURNING *) "
+                     f"SELECT {columns} FROM updated AS users LEFT JOIN topics ON topics.id = users.topic_id")
+        else:
+            query = (f"SELECT {columns} FROM users LEFT JOIN topics ON topics.id = users.topic_id "
+                     f"WHERE users.id = %(user_id)s")
+        data = {"user_id": user_id, **fields}
+        cursor.execute(query, data)
+        res = cursor.fetchone()
+        if res is None:
+            return None
+        return UserContext(user_id, *res)
+
+    def _cache_user_context(self, context: UserContext | None, version: int | None = None):
+        # version - значение get_version() до чтения, None - контекст получен после записи
+        if context is None:
+            return
+        user = {
+            "state": context.state,
+            "topic_id": context.topic_id,
+            "questions_number": context.questions_number,
+            "correct_answers_number": context.correct_answers_number
+        }
+        if version is None:
+            self.users.put(context.user_id, user)
+        else:
+            self.users.set(context.user_id, user, version)
+
+    def _update_user(self, user_id: int, fields: dict) -> UserContext | None:
+        # Поля со значением None не изменяются, запись пропускается для полей, значение которых уже в кеше
+        fields = {field: value for field, value in fields.items()
+                  if value is not None and not self.users.has_value(user_id, field, value)}
+        if not fields:
+            return None
+
+        try:
+            with self._cursor() as cursor:
+                context = self._query_user_context(cursor, user_id, fields)
+        except BaseException:
+            self.users.invalidate(user_id)
+            raise
+        self._cache_user_context(context)
+        return context
+
+    def get_user_context(self, user_id: int, statistics: bool = False) -> UserContext | None:
+        try:
+            version = self.users.get_version()
+            with self._cursor() as cursor:
+                context = self._query_user_context(cursor, user_id, {}, statistics)
+            self._cache_user_context(context, version)
+            return context
+        except (Exception, Error) as error:
+            print("Ошибка при получении данных пользователя.", error)
+
+    def update_user(self, user_id: int, **fields) -> UserContext | None:
+        # Несколько полей пользователя изменяются одним запросом (state, topic_id, questions_number,
+        # correct_answers_number, last_repeat, is_reminder_send). Возвращает контекст пользователя после изменения
+        try:
+            context = self._update_user(user_id, fields)
+            if context is None:
+                # Все значения уже записаны
+                return self.get_user_context(user_id)
+            return context
+        except (Exception, Error) as error:
+            print("Ошибка при обновлении пользователя.", error)
 
+    def reset_user(self, user_id: int, **fields) -> UserContext | None:
+        # Одна транзакция: пользователь добавляется, если его ещё нет, тест очищается, поля изменяются
+        try:
             query = (f"INSERT INTO users (id, topic_id, questions_number, correct_answers_number) "
-                     f"VALUES (%(user_id)s, %(topic_id)s, %(questions_number)s, %(correct_answers_number)s)")
+                     f"VALUES (%(user_id)s, (SELECT id FROM topics WHERE user_id IS NULL LIMIT 1), "
+                     f"%(questions_number)s, %(correct_answers_number)s) "
+                     f"ON CONFLICT (id) DO NOTHING")
             data = {
                 "user_id": user_id,
-                "topic_id": topic_id,
                 "questions_number": 5,
                 "correct_answers_number": 5,
             }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            try:
+                with self._cursor() as cursor:
+                    cursor.execute(query, data)
+                    cursor.execute(f"DELETE FROM test WHERE user_id = %(user_id)s", data)
+                    context = self._query_user_context(cursor, user_id, fields)
+            except BaseException:
+                self.users.invalidate(user_id)
+                raise
+            self._cache_user_context(context)
+            return context
         except (Exception, Error) as error:
             print("Ошибка при добавлении пользователя.", error)
 
+    def finish_test(self, user_id: int, word_ids: list[int], is_right: list[bool | None], **fields) -> UserContext | None:
+        # Одна транзакция: результаты теста сохраняются, поля пользователя изменяются
+        try:
+            try:
+                with self._cursor() as cursor:
+                    self._save_test(cursor, user_id, word_ids, is_right)
+                    context = self._query_user_context(cursor, user_id, fields)
+            except BaseException:
+                self.users.invalidate(user_id)
+                raise
+            self._cache_user_context(context)
+            return context
+        except (Exception, Error) as error:
+            print("Ошибка при сохранении результатов теста.", error)
+
     def get_user_by_id(self, user_id: int) -> tuple[Any, ...] | None:
         try:
             query = f"SELECT * FROM users WHERE id = %(user_id)s"
             data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            return self.cursor.fetchone()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                return cursor.fetchone()
         except (Exception, Error) as error:
             print("Ошибка при получении пользователя по id.", error)
             print("\nОшибка тут")
 
     def set_state(self, user_id: int, state: int = 0):
         try:
-            query = (f"UPDATE users "
-                     f"SET state = COALESCE(%(state)s, state)"
-                     f"WHERE id = %(user_id)s")
-            data = {
-                "user_id": user_id,
-                "state": state
-            }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            self._update_user(user_id, {"state": state})
         except (Exception, Error) as error:
             print("Ошибка при обновлении состояния бота пользователя.", error)
 
     def get_state(self, user_id: int) -> int | None:
         try:
-            query = f"SELECT state FROM users WHERE id = %(user_id)s"
-            data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            if res is None:
+            user = self._get_user(user_id)
+            if user is None:
                 return None
-            return res[0]
+            return user["state"]
         except (Exception, Error) as error:
             print("Ошибка при получении состояния бота пользователя по id.", error)
 
     def set_user_topic(self, user_id: int, topic_id: int):
         try:
-            query = (f"UPDATE users "
-                     f"SET topic_id = COALESCE(%(topic_id)s, topic_id)"
-                     f"WHERE id = %(user_id)s")
-            data = {
-                "user_id": user_id,
-                "topic_id": topic_id
-            }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            self._update_user(user_id, {"topic_id": topic_id})
         except (Exception, Error) as error:
             print("Ошибка при обновлении темы теста пользователя.", error)
 
@@ -101,64 +306,51 @@ class Database:
         try:
             query = f"SELECT title, description FROM users JOIN topics ON users.topic_id = topics.id WHERE users.id = %(user_id)s"
             data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            return self.cursor.fetchone()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                return cursor.fetchone()
         except (Exception, Error) as error:
             print("Ошибка при получении темы теста пользователя.", error)
 
+    def get_topic_keyboard(self, page: int = 0) -> str | None:
+        # Готовая разметка страницы клавиатуры выбора темы из каталога в памяти
+        try:
+            return self.topics.get_page_markup(page)
+        except (Exception, Error) as error:
+            print("Ошибка при получении клавиатуры выбора темы.", error)
+
     def get_topics(self) -> list[tuple[Any, ...]]:
         try:
-            query = f"SELECT id, title FROM topics"
-            self.cursor.execute(query)
-            return self.cursor.fetchall()
+            query = f"SELECT id, title FROM topics ORDER BY id"
+            with self._cursor() as cursor:
+                cursor.execute(query)
+                return cursor.fetchall()
         except (Exception, Error) as error:
             print("Ошибка при получении темы теста пользователя.", error)
 
     def set_user_questions_number(self, user_id: int, questions_number: int):
         try:
-            query = (f"UPDATE users "
-                     f"SET questions_number = COALESCE(%(questions_number)s, questions_number)"
-                     f"WHERE id = %(user_id)s")
-            data = {
-                "user_id": user_id,
-                "questions_number": questions_number
-            }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            self._update_user(user_id, {"questions_number": questions_number})
         except (Exception, Error) as error:
             print("Ошибка при обновлении темы теста пользователя.", error)
 
     def get_user_questions_number(self, user_id: int) -> int:
         try:
-            query = f"SELECT questions_number FROM users WHERE users.id = %(user_id)s"
-            data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            return res[0]
+            user = self._get_user(user_id)
+            return user["questions_number"]
         except (Exception, Error) as error:
             print("Ошибка при получении темы теста пользователя.", error)
 
     def set_user_correct_answers_number(self, user_id: int, correct_answers_number: int):
         try:
-            query = (f"UPDATE users "
-                     f"SET correct_answers_number = COALESCE(%(correct_answers_number)s, correct_answers_number)"
-                     f"WHERE id = %(user_id)s")
-            data = {
-                "user_id": user_id,
-                "correct_answers_number": correct_answers_number
-            }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            self._update_user(user_id, {"correct_answers_number": correct_answers_number})
         except (Exception, Error) as error:
             print("Ошибка при обновлении темы теста пользователя.", error)
 
     def get_user_correct_answers_number(self, user_id: int) -> int:
         try:
-            query = f"SELECT correct_answers_number FROM users WHERE users.id = %(user_id)s"
-            data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            return res[0]
+            user = self._get_user(user_id)
+            return user["correct_answers_number"]
         except (Exception, Error) as error:
             print("Ошибка при получении темы теста пользователя.", error)
 
@@ -170,8 +362,10 @@ class Database:
                 "description": description,
                 "user_id": user_id
             }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+            self.distractors.invalidate()
+            self.topics.invalidate()
         except (Exception, Error) as error:
             print("Ошибка при добавлении темы.", error)
 
@@ -186,8 +380,9 @@ class Database:
                 "usage_example": usage_example,
                 "usage_example_translation": usage_example_translation
             }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+            self.distractors.invalidate()
         except (Exception, Error) as error:
             print("Ошибка при добавлении слова.", error)
 
@@ -198,182 +393,162 @@ class Database:
                      f"WHERE topic_id = (SELECT topic_id FROM users WHERE id = %(user_id)s) "
                      f"ORDER BY correct_answers_number")
             data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchall()
-            if res is None:
-                return None
-            return res
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                res = cursor.fetchall()
+                if res is None:
+                    return None
+                return res
         except (Exception, Error) as error:
             print("Ошибка при получении вопроса для теста.", error)
 
-    def get_fake_words_for_question(self, word_id) -> list[str, str, str]:
-        try:
-            query = (f"SELECT word_translation FROM words "
-                     f"WHERE id != %(word_id)s "
-                     f"ORDER BY RANDOM() LIMIT 3")
-            data = {"word_id": word_id}
-            self.cursor.execute(query, data)
-            return [word[0] for word in self.cursor.fetchall()]
-        except (Exception, Error) as error:
-            print("Ошибка при получении вопроса для теста.", error)
-
-    def add_word_in_test(self, user_id, word_id):
-        try:
-            query = f"INSERT INTO test (user_id, word_id) VALUES (%(user_id)s, %(word_id)s)"
+    def select_words_for_test(self, user_id: int, intervals: tuple[int | None, ...]) -> list[tuple[Any, ...]] | None:
+        # Подбор слов для теста на стороне БД по кривой забывания:
+        # intervals - интервалы повторения в минутах, индексированные количеством правильных ответов.
+        # Сначала берутся слова, для которых пришло время повторения,
+        # затем недостающие добираются случайно из выученных (вышедших за кривую).
+        # Возвращает (id, word, word_translation, usage_example, usage_example_translation, correct_answers_number)
+        try:
+            query = (f"WITH curve AS ("
+                     f"    SELECT position - 1 AS correct_answers_number, "
+                     f"    NOW() - make_interval(mins => interval) AS repeat_before "
+                     f"    FROM UNNEST(%(intervals)s::integer[]) WITH ORDINALITY AS curve (interval, position) "
+                     f"    WHERE interval IS NOT NULL"
+                     f"), "
+                     f"user_words AS NOT MATERIALIZED ("
+                     f"    SELECT words.id, learning.correct_answers_number, learning.last_repeat, curve.repeat_before "
+                     f"    FROM words "
+                     f"    LEFT JOIN learning ON learning.word_id = words.id AND learning.user_id = %(user_id)s "
+                     f"    LEFT JOIN curve ON curve.correct_answers_number = learning.correct_answers_number "
+                     f"    WHERE words.topic_id = (SELECT topic_id FROM users WHERE id = %(user_id)s)"
+                     f"), "
+                     f"questions_number AS ("
+                     f"    SELECT questions_number FROM users WHERE id = %(user_id)s"
+                     f") "
+                     f"SELECT words.id, word, word_translation, usage_example, usage_example_translation, "
+                     f"correct_answers_number "
+                     f"FROM ("
+                     f"    (SELECT id, correct_answers_number, 0 AS priority FROM user_words "
+                     f"    WHERE correct_answers_number IS NULL "
+                     f"    OR repeat_before IS NOT NULL AND last_repeat <= repeat_before "
+                     f"    ORDER BY correct_answers_number LIMIT (SELECT * FROM questions_number)) "
+                     f"    UNION ALL "
+                     f"    (SELECT id, correct_answers_number, 1 AS priority FROM user_words "
+                     f"    WHERE correct_answers_number IS NOT NULL AND repeat_before IS NULL "
+                     f"    ORDER BY RANDOM() LIMIT (SELECT * FROM questions_number))"
+                     f") AS words_for_test "
+                     f"JOIN words ON words.id = words_for_test.id "
+                     f"ORDER BY priority "
+                     f"LIMIT (SELECT * FROM questions_number)")
             data = {
                 "user_id": user_id,
-                "word_id": word_id
+                "intervals": list(intervals)
             }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                return cursor.fetchall()
         except (Exception, Error) as error:
-            print("Ошибка при добавлении слова в пул вопросов теста.", error)
+            print("Ошибка при подборе слов для теста.", error)
 
-    def get_word_from_test(self, user_id):
+    def get_words_translations(self) -> list[tuple[int, int, str]] | None:
         try:
-            query = (f"SELECT word_id, word, word_translation FROM test JOIN words ON test.word_id = words.id "
-                     f"WHERE user_id = %(user_id)s AND is_right IS NULL "
-                     f"ORDER BY RANDOM()")
-            data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            return res
+            query = f"SELECT id, topic_id, word_translation FROM words"
+            with self._cursor() as cursor:
+                cursor.execute(query)
+                return cursor.fetchall()
         except (Exception, Error) as error:
-            print("Ошибка при получении слова из пула вопросов теста.", error)
+            print("Ошибка при получении переводов слов.", error)
 
-    def get_word_by_id_from_test(self, user_id, word_id):
-        try:
-            query = (f"SELECT word_id, word, word_translation FROM test JOIN words ON test.word_id = words.id "
-                     f"WHERE user_id = %(user_id)s AND word_id = %(word_id)s AND is_right IS NULL")
-            data = {
-                "user_id": user_id,
-                "word_id": word_id
-            }
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            return res
-        except (Exception, Error) as error:
-            print("Ошибка при получении слова из пула вопросов теста.", error)
+    def get_fake_words_for_test(self, word_ids: list[int]) -> list[list[str]]:
+        # Неправильные варианты для всех вопросов теста подбираются из индекса в памяти без запроса к БД
+        return self.distractors.sample_many(word_ids)
 
-    def set_is_right_in_test(self, user_id: int, word_id: int, is_right: bool):
+    def save_test(self, user_id: int, word_ids: list[int], is_right: list[bool | None]):
+        # Результаты теста записываются одной транзакцией: прежние строки теста удаляются,
+        # новые добавляются одним запросом
         try:
-            query = (f"UPDATE test "
-                     f"SET is_right = COALESCE(%(is_right)s, is_right)"
-                     f"WHERE user_id = %(user_id)s AND word_id = %(word_id)s")
-            data = {
-                "user_id": user_id,
-                "word_id": word_id,
-                "is_right": is_right
-            }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                self._save_test(cursor, user_id, word_ids, is_right)
         except (Exception, Error) as error:
-            print("Ошибка при обновлении правильности вопроса.", error)
+            print("Ошибка при сохранении результатов теста.", error)
+
+    def _save_test(self, cursor, user_id: int, word_ids: list[int], is_right: list[bool | None]):
+        delete_query = f"DELETE FROM test WHERE user_id = %(user_id)s"
+        insert_query = (f"INSERT INTO test (user_id, word_id, is_right) "
+                        f"SELECT %(user_id)s, word_id, is_right "
+                        f"FROM UNNEST(%(word_ids)s::integer[], %(is_right)s::boolean[]) AS answers (word_id, is_right)")
+        data = {
+            "user_id": user_id,
+            "word_ids": list(word_ids),
+            "is_right": list(is_right)
+        }
+        cursor.execute(delete_query, data)
+        if word_ids:
+            cursor.execute(insert_query, data)
 
     def clear_test(self, user_id: int):
         try:
             query = (f"DELETE FROM test "
                      f"WHERE user_id = %(user_id)s")
             data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
         except (Exception, Error) as error:
             print("Ошибка при очистке пула вопросов теста пользователя.", error)
 
-    def add_learning(self, user_id: int, word_id: int, correct_answers_number: int):
-        try:
-            query = (f"INSERT INTO learning (user_id, word_id, correct_answers_number, last_repeat)"
-                     f"VALUES (%(user_id)s, %(word_id)s, %(correct_answers_number)s, %(last_repeat)s)")
-            data = {
-                "user_id": user_id,
-                "word_id": word_id,
-                "correct_answers_number": correct_answers_number,
-                "last_repeat": datetime.datetime.now()
-            }
-            self.cursor.execute(query, data)
-            self.connection.commit()
-        except (Exception, Error) as error:
-            print("Ошибка при добавлении слова в таблицу прогресса обучения.", error)
-
-    def update_learning(self, user_id: int, word_id: int, correct_answers_number: int):
-        try:
-            query = (f"UPDATE learning "
-                     f"SET correct_answers_number = %(correct_answers_number)s, "
-                     f"last_repeat = %(last_repeat)s "
-                     f"WHERE user_id = %(user_id)s AND word_id = %(word_id)s")
+    def record_answer(self, user_id: int, word_id: int, is_right: bool):
+        # Счётчик правильных ответов увеличивается или сбрасывается одним запросом,
+        # поэтому одновременные ответы на одно слово не теряют обновления
+        try:
+            query = (f"INSERT INTO learning (user_id, word_id, correct_answers_number, last_repeat) "
+                     f"VALUES (%(user_id)s, %(word_id)s, "
+                     f"CASE WHEN %(is_right)s THEN 1 ELSE 0 END, %(last_repeat)s) "
+                     f"ON CONFLICT (user_id, word_id) DO UPDATE "
+                     f"SET correct_answers_number = "
+                     f"CASE WHEN %(is_right)s THEN learning.correct_answers_number + 1 ELSE 0 END, "
+                     f"last_repeat = EXCLUDED.last_repeat "
+                     f"RETURNING correct_answers_number")
             data = {
                 "user_id": user_id,
                 "word_id": word_id,
-                "correct_answers_number": correct_answers_number,
+                "is_right": is_right,
                 "last_repeat": datetime.datetime.now()
             }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                res = cursor.fetchone()
+                if res is None:
+                    return None
+                return res[0]
         except (Exception, Error) as error:
-            print("Ошибка при обновлении слова в таблице прогресса обучения.", error)
-
-    def get_correct_answers_number_from_learning(self, user_id: int, word_id: int):
-        try:
-            query = (f"SELECT correct_answers_number FROM learning "
-                     f"WHERE user_id = %(user_id)s AND word_id = %(word_id)s")
-            data = {
-                "user_id": user_id,
-                "word_id": word_id
-            }
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            if res is None:
-                return None
-            return res[0]
-        except (Exception, Error) as error:
-            print("Ошибка при получении количества правильных ответов слова из таблицы прогресса обучения.", error)
-
-    def get_is_right_grouped_words(self, user_id: int):
-        try:
-            query = (f"SELECT is_right, COUNT(*) FROM test "
-                     f"WHERE user_id = %(user_id)s "
-                     f"GROUP BY is_right ")
-            data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchall()
-            return res
-        except (Exception, Error) as error:
-            print("Ошибка при получении количества ответов по правильности из таблицы прогресса обучения.", error)
-
-    def get_word_usage_example_from_test(self, user_id):
-        try:
-            query = (f"SELECT usage_example, usage_example_translation FROM test JOIN words ON test.word_id = words.id "
-                     f"WHERE user_id = %(user_id)s AND is_right IS NULL")
-            data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            return res
-        except (Exception, Error) as error:
-            print("Ошибка при получении слова из пула вопросов теста.", error)
+            print("Ошибка при сохранении ответа в таблице прогресса обучения.", error)
 
     def get_learned_word_number(self, user_id: int) -> int | None:
         try:
-            query = (f"SELECT COUNT(*) FROM learning "
-                     f"WHERE correct_answers_number >= (SELECT correct_answers_number FROM users WHERE id = %(user_id)s)")
+            # Счётчики поддерживаются триггерами (migrations/003_statistics_counters.sql)
+            query = (f"SELECT COALESCE(SUM(learned_words_number), 0) FROM user_topic_statistics "
+                     f"WHERE user_id = %(user_id)s")
             data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            if res is None:
-                return None
-            return res[0]
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                res = cursor.fetchone()
+                if res is None:
+                    return None
+                return res[0]
         except (Exception, Error) as error:
             print("Ошибка при получении количества выученных слов.", error)
 
     def get_word_number_in_topic(self, user_id: int) -> int | None:
         try:
-            query = (f"SELECT COUNT(*) FROM words "
-                     f"WHERE topic_id = (SELECT topic_id FROM users WHERE id = %(user_id)s)")
+            query = (f"SELECT words_number FROM topics "
+                     f"WHERE id = (SELECT topic_id FROM users WHERE id = %(user_id)s)")
             data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            if res is None:
-                return None
-            return res[0]
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                res = cursor.fetchone()
+                if res is None:
+                    return None
+                return res[0]
         except (Exception, Error) as error:
             print("Ошибка при получении количества слво в теме.", error)
 
@@ -381,11 +556,12 @@ class Database:
         try:
             query = f"SELECT last_repeat FROM users WHERE id = %(user_id)s"
             data = {"user_id": user_id}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchone()
-            if res is None:
-                return None
-            return res[0]
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                res = cursor.fetchone()
+                if res is None:
+                    return None
+                return res[0]
         except (Exception, Error) as error:
             print("Ошибка при получении последнего прохождения теста пользователем.", error)
 
@@ -393,27 +569,47 @@ class Database:
         try:
             query = (f"UPDATE users "
                      f"SET last_repeat = COALESCE(%(last_repeat)s, last_repeat) "
-                     f"WHERE id = %(user_id)s")
+                     f"WHERE id = %(user_id)s "
+                     f"RETURNING last_repeat")
             data = {
                 "user_id": user_id,
                 "last_repeat": datetime.datetime.now()
             }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                res = cursor.fetchone()
+                if res is None:
+                    return None
+                return res[0]
         except (Exception, Error) as error:
             print("Ошибка при обвновлении последнего прохождения теста пользователем.", error)
 
-    def get_all_users_to_send_reminder(self, interval=30):
+    def get_users_waiting_reminder(self):
         try:
-            query = f"SELECT id FROM users WHERE is_reminder_send = false AND last_repeat < NOW() - INTERVAL '%(interval)s minutes'"
-            data = {"interval": interval}
-            self.cursor.execute(query, data)
-            res = self.cursor.fetchall()
-            if res is None:
-                return None
-            return res
+            query = (f"SELECT id, last_repeat FROM users "
+                     f"WHERE is_reminder_send = false AND last_repeat IS NOT NULL")
+            with self._cursor() as cursor:
+                cursor.execute(query)
+                return cursor.fetchall()
         except (Exception, Error) as error:
-            print("Ошибка при получении пользователей для отправки напоминаний.", error)
+            print("Ошибка при получении пользователей, ожидающих напоминания.", error)
+
+    def claim_reminders(self, user_ids: list[int], interval=30):
+        # Возвращает id пользователей, которым нужно отправить напоминание
+        try:
+            query = (f"UPDATE users SET is_reminder_send = true "
+                     f"WHERE id = ANY(%(user_ids)s) AND is_reminder_send = false "
+                     f"AND last_repeat < NOW() - INTERVAL '%(interval)s minutes' "
+                     f"RETURNING id")
+            data = {
+                "user_ids": user_ids,
+                "interval": interval
+            }
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
+                return [row[0] for row in cursor.fetchall()]
+        except (Exception, Error) as error:
+            print("Ошибка при обновлении флагов отправки напоминаний.", error)
 
     def set_is_reminder_send(self, user_id: int, is_reminder_send: bool):
         try:
@@ -424,7 +620,26 @@ class Database:
                 "user_id": user_id,
                 "is_reminder_send": is_reminder_send
             }
-            self.cursor.execute(query, data)
-            self.connection.commit()
+            with self._cursor() as cursor:
+                cursor.execute(query, data)
         except (Exception, Error) as error:
             print("Ошибка при обновлении флага отправки напоминания.", error)
+
+
+# Время выполнения каждого публичного метода (метрика bot_db_method_seconds)
+metrics.instrument_methods(Database, metrics.DB_METHOD_SECONDS)
+
+
+class AsyncDatabase:
+    # Асинхронная обёртка над Database: каждый метод выполняется в отдельном потоке
+    # со своим соединением из пула и не блокирует цикл событий
+    def __init__(self, database: Database):
+        self.database = database
+
+    def __getattr__(self, name):
+        method = getattr(self.database, name)
+
+        async def wrapper(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return wrapper
@@ -1,49 +1,189 @@
+import asyncio
 import json
+import random
 
-import requests
+import aiohttp
+
+import metrics
+from rate_limiter import RateLimiter
 
 
 class TelegramBot:
-    def __init__(self, api_token):
-        self.telegram_api_url = f'https://api.telegram.org/bot{api_token}'
+    # Приоритеты запросов: ответы пользователю отправляются раньше фоновых рассылок
+    PRIORITY_HIGH = 0
+    PRIORITY_LOW = 1
+
+    def __init__(self, api_token, connections_limit=100, rate_limit=30, chat_rate_limit=1, chat_burst=3,
+                 retries_number=3, connect_timeout=5.0, read_timeout=30.0, api_url='https://api.telegram.org'):
+        self.telegram_api_url = f'{api_url}/bot{api_token}'
+        self.connections_limit = connections_limit
+        # Запрос не может зависнуть: ограничено время соединения и ожидания каждой порции ответа
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.session = None
+        self.rate_limiter = RateLimiter(rate=rate_limit, chat_rate=chat_rate_limit, chat_burst=chat_burst)
+        # Сколько раз повторяется запрос после 429, ошибки сервера 5xx или неудачного соединения
+        self.retries_number = retries_number
+
+    @staticmethod
+    def dump_markup(reply_markup) -> str:
+        # Разметка из keyboards_menu уже сериализована
+        if isinstance(reply_markup, str):
+            return reply_markup
+        return json.dumps(reply_markup)
+
+    def get_retry_delay(self, attempt) -> float:
+        # Экспоненциальная задержка со случайным разбросом, чтобы повторы не шли одной волной
+        return min(0.5 * 2 ** attempt, 10.0) * random.uniform(0.5, 1.5)
+
+    async def _post(self, method, data=None, chat_id=None, priority=PRIORITY_HIGH, timeout=None, rate_limited=True):
+        # Возвращает поле result ответа Telegram или None при ошибке.
+        # Одна сессия на всё время работы бота: соединения с api.telegram.org
+        # переиспользуются (keep-alive) вместо нового TLS-рукопожатия на каждый запрос.
+        # rate_limited=False - запрос не учитывается в лимитах отправки (получение обновлений)
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connections_limit)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+        for attempt in range(self.retries_number + 1):
+            if rate_limited:
+                await self.rate_limiter.acquire(chat_id, priority)
+            try:
+                async with self.session.post(f'{self.telegram_api_url}/{method}', data=data,
+                                             timeout=timeout or self.timeout) as response:
+                    status = response.status
+                    try:
+                        result = await response.json(content_type=None)
+                    except ValueError:
+                        result = None
+                    if not isinstance(result, dict):
+                        result = {"ok": False, "description": f"HTTP {status}"}
+            except aiohttp.ClientConnectorError as error:
+                # Соединение не установлено, запрос до Telegram не дошёл и его можно повторить
+                if attempt < self.retries_number:
+                    await asyncio.sleep(self.get_retry_delay(attempt))
+                    continue
+                print(f"Ошибка при соединении с Telegram ({method}).", error)
+                return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # Запрос мог быть выполнен, повтор привёл бы к дублированию сообщения
+                print(f"Ошибка при запросе к Telegram ({method}).", repr(error))
+                return None
+
+            if result.get('ok'):
+                return result.get('result')
+
+            if attempt < self.retries_number:
+                if status == 429:
+                    retry_after = (result.get('parameters') or {}).get('retry_after', 1)
+                    if rate_limited:
+                        self.rate_limiter.pause(chat_id, retry_after + random.uniform(0, 0.5))
+                    else:
+                        await asyncio.sleep(retry_after)
+                    continue
+                if status >= 500:
+                    await asyncio.sleep(self.get_retry_delay(attempt))
+                    continue
 
-    def deleteWebhook(self):
-        requests.post(f'{self.telegram_api_url}/deleteWebhook')
+            print(f"Ошибка Telegram ({method}): {result.get('description')}")
+            return None
 
-    def setWebhook(self, url):
-        requests.post(f'{self.telegram_api_url}/setWebhook', {"url": url})
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    def stats(self) -> dict:
+        return self.rate_limiter.stats()
+
+    async def deleteWebhook(self):
+        return await self._post('deleteWebhook')
+
+    async def setWebhook(self, url):
+        return await self._post('setWebhook', {"url": url})
+
+    async def getUpdates(self, offset=None, limit=100, timeout=0, allowed_updates=None):
+        # Long polling: Telegram держит запрос до timeout секунд, пока нет новых обновлений.
+        # Обновления с update_id меньше offset считаются подтверждёнными и больше не возвращаются
+        data = {
+            "limit": limit,
+            "timeout": timeout
+        }
+        if offset is not None:
+            data["offset"] = offset
+        if allowed_updates is not None:
+            data["allowed_updates"] = json.dumps(allowed_updates)
+        # Ожидание ответа продлевается на время удержания запроса
+        request_timeout = aiohttp.ClientTimeout(sock_connect=self.timeout.sock_connect,
+                                                sock_read=self.timeout.sock_read + timeout)
+        return await self._post('getUpdates', data, timeout=request_timeout, rate_limited=False)
+
+    async def sendMessage(self, chat_id, text, reply_markup=None, parse_mode=None, priority=PRIORITY_HIGH):
+        data = {
+            "chat_id": chat_id,
+            "text": text
+        }
+        if reply_markup:
+            data["reply_markup"] = self.dump_markup(reply_markup)
+        if parse_mode:
+            data["parse_mode"] = parse_mode
+        # Лимит Telegram на сообщения в один чат учитывается для отправки и изменения сообщений
+        return await self._post('sendMessage', data, chat_id=chat_id, priority=priority)
 
-    def sendMessage(self, chat_id, text, reply_markup=None, parse_mode=None):
+    async def editMessageText(self, chat_id, message_id, text, reply_markup=None, parse_mode=None,
+                              priority=PRIORITY_HIGH):
+        # Без reply_markup inline-кнопки сообщения удаляются
         data = {
             "chat_id": chat_id,
+            "message_id": message_id,
             "text": text
         }
         if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
+            data["reply_markup"] = self.dump_markup(reply_markup)
         if parse_mode:
             data["parse_mode"] = parse_mode
-        requests.post(f'{self.telegram_api_url}/sendMessage', data=data)
+        return await self._post('editMessageText', data, chat_id=chat_id, priority=priority)
+
+    async def editMessageReplyMarkup(self, chat_id, message_id, reply_markup=None):
+        data = {
+            "chat_id": chat_id,
+            "message_id": message_id
+        }
+        if reply_markup:
+            data["reply_markup"] = self.dump_markup(reply_markup)
+        return await self._post('editMessageReplyMarkup', data, chat_id=chat_id)
 
-    def deleteMessage(self, chat_id, message_id):
+    async def answerCallbackQuery(self, callback_query_id, text=None, show_alert=False):
+        # Убирает индикатор загрузки на нажатой inline-кнопке
+        data = {
+            "callback_query_id": callback_query_id
+        }
+        if text:
+            data["text"] = text
+        if show_alert:
+            data["show_alert"] = "true"
+        return await self._post('answerCallbackQuery', data)
+
+    async def deleteMessage(self, chat_id, message_id):
         data = {
             "chat_id": chat_id,
             "message_id": message_id
         }
-        requests.post(f'{self.telegram_api_url}/deleteMessage', data=data)
+        return await self._post('deleteMessage', data)
 
-    def setMyCommands(self, commands, scope=None):
+    async def setMyCommands(self, commands, scope=None):
         data = {
             "commands": json.dumps(commands)
         }
         if scope:
             data['scope'] = json.dumps(scope)
-        requests.post(f'{self.telegram_api_url}/setMyCommands', data=data)
+        return await self._post('setMyCommands', data)
 
-    def deleteMyCommands(self, scope=None):
+    async def deleteMyCommands(self, scope=None):
         data = {}
         if scope:
             data['scope'] = json.dumps(scope)
-        requests.post(f'{self.telegram_api_url}/deleteMyCommands', data=data)
-
+        return await self._post('deleteMyCommands', data)
 
 
+# Время и ошибки каждого метода API (метрики bot_telegram_request_*): None вместо результата - ошибка
+metrics.instrument_methods(TelegramBot, metrics.TELEGRAM_REQUEST_SECONDS, metrics.TELEGRAM_REQUEST_ERRORS,
+                           is_error=lambda result: result is None, exclude=('close', 'stats', 'get_retry_delay'))
@@ -2,56 +2,181 @@ import asyncio
 import threading
 import time
 
-from flask import Flask, request
+from aiohttp import web
+from flask import Flask, Response, request
 from dotenv import load_dotenv
 
 # load_dotenv('.env')
 
-from config import WEB_HOOK_URL, APP_PORT, APP_HOST
-from handlers import command_handlers, callback_handlers, handlers, db, bot, main
+from config import WEB_HOOK_URL, APP_PORT, APP_HOST, APP_SERVER, UPDATE_WORKERS_NUMBER, UPDATE_QUEUE_SIZE, \
+    POLLING_TIMEOUT, POLLING_LIMIT
+import metrics
+from handlers import router, db, bot, main, reminders, forgetting_curve, test_sessions
+from update import Update
+from update_queue import UpdateQueue
 
 app = Flask(__name__)
 
+# Цикл событий, в котором выполняются обработчики при работе через Flask
+flask_loop = None
+flask_loop_lock = threading.Lock()
+
+
+async def dispatch(update: Update):
+    await router.dispatch(update, db.get_state)
+
+
+update_queue = UpdateQueue(dispatch, workers_number=UPDATE_WORKERS_NUMBER, max_size=UPDATE_QUEUE_SIZE)
+
+# Состояние очереди обновлений, лимитов Telegram, кеша пользователей, напоминаний,
+# кривой забывания, тестов и число обновлений по маршрутам в /metrics
+metrics.registry.add_collector('bot_update_queue', update_queue.stats)
+metrics.registry.add_collector('bot_telegram_rate_limiter', bot.stats)
+metrics.registry.add_collector('bot_user_cache', db.database.users.stats)
+metrics.registry.add_collector('bot_reminders', reminders.stats)
+metrics.registry.add_collector('bot_forgetting_curve', forgetting_curve.stats)
+metrics.registry.add_collector('bot_test_sessions', test_sessions.stats)
+metrics.registry.add_collector('bot_router', router.stats)
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+async def enqueue_update(update) -> tuple[str, int]:
+    # Обновление только ставится в очередь: ответ Telegram отправляется сразу,
+    # а обработчики выполняются воркерами очереди
+    if not isinstance(update, dict) or not isinstance(update.get('update_id'), int):
+        return "bad update", 400
+    try:
+        parsed_update = Update.parse(update)
+    except (KeyError, TypeError, AttributeError):
+        return "bad update", 400
+
+    # Обновления других типов бот не обрабатывает
+    if parsed_update is None:
+        return "ok", 200
+
+    if not await update_queue.submit(parsed_update, parsed_update.user_id):
+        return "queue is full", 503
+    return "ok", 200
+
+
+def get_flask_loop():
+    global flask_loop
+    with flask_loop_lock:
+        if flask_loop is None:
+            flask_loop = asyncio.new_event_loop()
+            threading.Thread(target=flask_loop.run_forever, daemon=True).start()
+            asyncio.run_coroutine_threadsafe(update_queue.start(), flask_loop).result()
+    return flask_loop
+
 
 @app.route('/', methods=['POST'])
 def receive_update():
-    msg_text = request.json.get('message', {}).get('text')
-    command_handler = command_handlers.get(msg_text)
-    if command_handler:
-        state = command_handler.get('state')
-        user_id = request.json['message']['from']['id']
-        cur_state = db.get_state(user_id)
-        if state in {cur_state, None}:
-            handler = command_handler.get('handler')
-            handler()
-            return "ok", 200
-
-    if request.json.get('callback_query'):
-        data = request.json['callback_query']['data']
-        callback_handler = callback_handlers.get(data)
-        if callback_handler:
-            callback_handler()
-            return "ok", 200
-
-    user_id = None
-    if request.json.get('callback_query'):
-        user_id = request.json['callback_query']['from']['id']
-    if request.json.get('message'):
-        user_id = request.json['message']['from']['id']
-    cur_state = db.get_state(user_id)
-    handler = handlers.get(cur_state)
-
-    if handler:
-        handler()
+    update = request.get_json(silent=True)
+    future = asyncio.run_coroutine_threadsafe(enqueue_update(update), get_flask_loop())
+    return future.result()
 
-    return "ok", 200
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.registry.render(), content_type=METRICS_CONTENT_TYPE)
 
-if __name__ == '__main__':
-    bot.deleteWebhook()
+
+async def get_metrics_async(web_request):
+    return web.Response(body=metrics.registry.render().encode('utf-8'), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+
+async def receive_update_async(web_request):
+    try:
+        update = await web_request.json()
+    except ValueError:
+        update = None
+    text, status = await enqueue_update(update)
+    return web.Response(text=text, status=status)
+
+
+async def on_startup(web_app):
+    await update_queue.start()
+
+    await bot.deleteWebhook()
+    await asyncio.sleep(1)
+    await bot.setWebhook(WEB_HOOK_URL)
+
+    web_app['reminder'] = asyncio.create_task(main())
+
+
+async def on_cleanup(web_app):
+    web_app['reminder'].cancel()
+    await update_queue.stop()
+    await bot.close()
+
+
+def run_aiohttp():
+    web_app = web.Application()
+    web_app.router.add_post('/', receive_update_async)
+    web_app.router.add_get('/metrics', get_metrics_async)
+    web_app.on_startup.append(on_startup)
+    web_app.on_cleanup.append(on_cleanup)
+
+    web.run_app(web_app, host=APP_HOST, port=APP_PORT)
+
+
+async def process_updates_batch(updates) -> int:
+    # Возвращает offset для следующего getUpdates: обновления пачки ставятся в очередь
+    # (разные пользователи обрабатываются параллельно, обновления одного - по порядку)
+    # и подтверждаются только после обработки всей пачки
+    offset = None
+    for update in updates:
+        text, status = await enqueue_update(update)
+        if status == 503:
+            # Очередь переполнена: обновление и следующие за ним будут получены повторно
+            break
+        offset = update['update_id'] + 1
+    await update_queue.join()
+    return offset
+
+
+async def poll_updates():
+    await update_queue.start()
+    # getUpdates не работает, пока установлен webhook
+    await bot.deleteWebhook()
+    reminder = asyncio.create_task(main())
+
+    offset = None
+    try:
+        while True:
+            updates = await bot.getUpdates(offset, limit=POLLING_LIMIT, timeout=POLLING_TIMEOUT,
+                                           allowed_updates=["message", "callback_query"])
+            if updates is None:
+                # Ошибка уже выведена TelegramBot, запрос повторяется после паузы
+                await asyncio.sleep(1)
+                continue
+            if updates:
+                offset = await process_updates_batch(updates) or offset
+    finally:
+        reminder.cancel()
+        await update_queue.stop()
+        await bot.close()
+
+
+def run_polling():
+    asyncio.run(poll_updates())
+
+
+def run_flask():
+    loop = get_flask_loop()
+    asyncio.run_coroutine_threadsafe(bot.deleteWebhook(), loop).result()
     time.sleep(1)
-    response = bot.setWebhook(WEB_HOOK_URL)
+    asyncio.run_coroutine_threadsafe(bot.setWebhook(WEB_HOOK_URL), loop).result()
 
-    threading.Thread(target=asyncio.run, kwargs={"main": main()}).start()
+    asyncio.run_coroutine_threadsafe(main(), loop)
 
     app.run(host=APP_HOST, port=APP_PORT)
+
+
+if __name__ == '__main__':
+    if APP_SERVER == 'flask':
+        run_flask()
+    elif APP_SERVER == 'polling':
+        run_polling()
+    else:
+        run_aiohttp()
@@ -0,0 +1,120 @@
+# Скорость загрузки словаря import_words.py: сгенерированный TSV-файл и JSON-файл в формате data.json
+# с повторяющимися словами загружаются через COPY, затем то же делается построчными
+# Database.add_word на небольшой выборке для сравнения.
+#
+# Запуск из корня проекта после миграций (python migrate.py):
+#     python -m benchmarks.bench_import_words [число слов]
+# Загрузка выполняется в транзакции, которая откатывается, БД не изменяется.
+import json
+import os
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+from config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from import_words import import_words, read_words
+
+WORDS_NUMBER = 1_000_000
+WORDS_IN_TOPIC = 5000
+# Доля строк, повторяющих уже встречавшееся в файле слово
+DUPLICATES_SHARE = 0.1
+ROW_BY_ROW_WORDS = 2000
+
+
+def generate_rows(words_number):
+    duplicates_every = int(1 / DUPLICATES_SHARE)
+    for i in range(words_number):
+        number = i - 1 if i % duplicates_every == duplicates_every - 1 else i
+        topic = number // WORDS_IN_TOPIC
+        yield (f"bench import {topic}", f"Тема {topic}", f"word {number}", f"слово {number}",
+               f"Example\twith \"quotes\" and \\ {number}", None)
+
+
+def write_tsv(path, words_number):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("topic\ttopic_description\tword\ttranslation\tusage_example\tusage_example_translation\n")
+        for row in generate_rows(words_number):
+            file.write("\t".join((value or "").replace("\t", " ") for value in row) + "\n")
+
+
+def write_json(path, words_number):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("[")
+        topic_title = None
+        for title, description, word, translation, usage_example, _ in generate_rows(words_number):
+            if title != topic_title:
+                if topic_title is not None:
+                    file.write("]},")
+                file.write(json.dumps({"title": title, "description": description}, ensure_ascii=False)[:-1]
+                           + ', "words": [')
+                topic_title = title
+            else:
+                file.write(",")
+            file.write(json.dumps({"word": word, "translation": translation, "usage_example": usage_example},
+                                  ensure_ascii=False))
+        file.write("]}]")
+
+
+def measure(connection, path, words_number):
+    with connection.cursor() as cursor:
+        result = import_words(cursor, read_words(path))
+        cursor.execute("SELECT SUM(words_number) FROM topics WHERE title LIKE 'bench import %%'")
+        words_in_topics = cursor.fetchone()[0]
+    connection.rollback()
+
+    expected_words = words_number - words_number // int(1 / DUPLICATES_SHARE)
+    assert result["words"] == expected_words, (result["words"], expected_words)
+    assert words_in_topics == expected_words, (words_in_topics, expected_words)
+    print(f"{os.path.basename(path)}: строк {result['rows']}, слов {result['words']}, "
+          f"дубликатов {result['duplicates']}, COPY {result['copy_time']:.2f} с, "
+          f"вставка {result['insert_time']:.2f} с, {result['rows'] / result['total_time']:.0f} строк/с")
+
+
+def measure_row_by_row(connection):
+    # Прежний способ: отдельный INSERT и COMMIT на каждое слово
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO topics (title) VALUES ('bench import row by row') RETURNING id")
+        topic_id = cursor.fetchone()[0]
+    connection.commit()
+    try:
+        started_at = time.monotonic()
+        for i in range(ROW_BY_ROW_WORDS):
+            with connection.cursor() as cursor:
+                cursor.execute("INSERT INTO words (topic_id, word, word_translation) VALUES (%s, %s, %s)",
+                               (topic_id, f"word {i}", f"слово {i}"))
+            connection.commit()
+        elapsed = time.monotonic() - started_at
+        print(f"построчно: {ROW_BY_ROW_WORDS} слов, {ROW_BY_ROW_WORDS / elapsed:.0f} строк/с")
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM words WHERE topic_id = %s", (topic_id,))
+            cursor.execute("DELETE FROM topics WHERE id = %s", (topic_id,))
+        connection.commit()
+
+
+def main(words_number):
+    connection = psycopg2.connect(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME
+    )
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            tsv_path = os.path.join(directory, "words.tsv")
+            json_path = os.path.join(directory, "words.json")
+            write_tsv(tsv_path, words_number)
+            write_json(json_path, words_number)
+
+            measure(connection, tsv_path, words_number)
+            measure(connection, json_path, words_number)
+        measure_row_by_row(connection)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else WORDS_NUMBER)
@@ -0,0 +1,107 @@
+# Сравнение подбора слов для теста:
+# выборка всей темы с фильтрацией в Python (прежний genQuestions)
+# против подбора на стороне БД (Database.select_words_for_test).
+#
+# Запуск из корня проекта: python -m benchmarks.bench_questions_selection
+# Используется БД из переменных окружения (config.py), тестовые данные удаляются после замера.
+import datetime
+import json
+import random
+import statistics
+import time
+
+from config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from Database import Database
+from forgetting_curve import ForgettingCurve
+
+TOPIC_SIZES = [100, 10_000, 100_000]
+QUESTIONS_NUMBER = 20
+REPEATS = 20
+USER_ID = 2_000_000_000
+
+
+def seed(db, words_number):
+    with db._cursor() as cursor:
+        cursor.execute("INSERT INTO topics (title) VALUES ('benchmark') RETURNING id")
+        topic_id = cursor.fetchone()[0]
+        cursor.execute("INSERT INTO users (id, topic_id, questions_number, correct_answers_number) "
+                       "VALUES (%s, %s, %s, 5)", (USER_ID, topic_id, QUESTIONS_NUMBER))
+        cursor.execute("INSERT INTO words (topic_id, word, word_translation) "
+                       "SELECT %s, 'word ' || i, 'слово ' || i FROM generate_series(1, %s) AS i",
+                       (topic_id, words_number))
+        # Прогресс изучения примерно для 60% слов со случайным числом ответов и временем повторения
+        cursor.execute("INSERT INTO learning (user_id, word_id, correct_answers_number, last_repeat) "
+                       "SELECT %s, id, floor(random() * 7), NOW() - random() * INTERVAL '10 minutes' "
+                       "FROM words WHERE topic_id = %s AND random() < 0.6",
+                       (USER_ID, topic_id))
+        cursor.execute("ANALYZE words")
+        cursor.execute("ANALYZE learning")
+
+
+def cleanup(db):
+    with db._cursor() as cursor:
+        cursor.execute("DELETE FROM learning WHERE user_id = %s", (USER_ID,))
+        cursor.execute("DELETE FROM test WHERE user_id = %s", (USER_ID,))
+        cursor.execute("DELETE FROM users WHERE id = %s", (USER_ID,))
+        cursor.execute("DELETE FROM words WHERE topic_id IN (SELECT id FROM topics WHERE title = 'benchmark')")
+        cursor.execute("DELETE FROM topics WHERE title = 'benchmark'")
+
+
+def select_in_python(db, conf_file):
+    max_questions_number = db.get_user_questions_number(USER_ID)
+    all_words = db.get_words_for_questions(USER_ID)
+    test_words = []
+    learned_words = []
+    for word_id, correct_answers_number, last_repeat in all_words:
+        interval = 0
+        if correct_answers_number is not None:
+            interval = conf_file.get(f"{correct_answers_number}")
+        if interval is None:
+            learned_words.append(word_id)
+            continue
+        if last_repeat is not None and datetime.datetime.now()-last_repeat < datetime.timedelta(minutes=interval):
+            continue
+        test_words.append(word_id)
+        if len(test_words) >= max_questions_number:
+            break
+    if len(test_words) < max_questions_number:
+        test_words += random.sample(learned_words, min(len(learned_words), max_questions_number-len(test_words)))
+    return test_words, len(all_words)
+
+
+def select_in_db(db, intervals):
+    test_words = db.select_words_for_test(USER_ID, intervals)
+    return test_words, len(test_words)
+
+
+def measure(function, *args):
+    timings = []
+    rows = 0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        _, rows = function(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings), rows
+
+
+def main():
+    db = Database(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME)
+    with open('config.json', 'r') as file:
+        conf_file = json.load(file)
+    intervals = ForgettingCurve('config.json').get_intervals()
+
+    print(f"{'words':>8} | {'path':<8} | {'median, ms':>10} | {'max, ms':>8} | {'rows fetched':>12}")
+    for words_number in TOPIC_SIZES:
+        cleanup(db)
+        seed(db, words_number)
+        try:
+            for name, function, args in [("python", select_in_python, (db, conf_file)),
+                                         ("sql", select_in_db, (db, intervals))]:
+                median, worst, rows = measure(function, *args)
+                print(f"{words_number:>8} | {name:<8} | {median:>10.2f} | {worst:>8.2f} | {rows:>12}")
+        finally:
+            cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
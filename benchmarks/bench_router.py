@@ -0,0 +1,145 @@
+# Накладные расходы выбора обработчика на одно обновление:
+# прежний dispatch (контекст запроса Flask, поиск по command_handlers, callback_handlers и handlers
+# с двумя запросами состояния) против Update.parse и Router из handlers.py.
+#
+# Запуск из корня проекта: python -m benchmarks.bench_router
+# Обработчики заменены пустыми корутинами, состояние берётся из словаря в памяти,
+# поэтому в замер входит только разбор обновления и выбор маршрута.
+import asyncio
+import os
+import random
+import time
+
+from flask import Flask, request
+
+os.environ.setdefault('API_TOKEN', 'test')
+
+import handlers  # noqa: E402
+from router import Router  # noqa: E402
+from states import States  # noqa: E402
+from test_session import ANSWER_CALLBACK_PREFIX, encode_answer  # noqa: E402
+from update import Update  # noqa: E402
+
+UPDATES_NUMBER = 100_000
+USERS_NUMBER = 1000
+
+
+async def noop(update=None):
+    pass
+
+
+def make_updates():
+    # Смесь обновлений, близкая к реальной: в основном ответы на вопросы теста
+    states = {}
+    updates = []
+    for update_id in range(UPDATES_NUMBER):
+        user_id = random.randrange(USERS_NUMBER)
+        kind = random.random()
+        if kind < 0.7:
+            states[user_id] = States.TEST_STATE
+            update = {"callback_query": {"id": "1", "from": {"id": user_id}, "data": encode_answer(user_id, update_id, 1),
+                                         "message": {"message_id": 1, "chat": {"id": user_id}}}}
+        elif kind < 0.9:
+            states[user_id] = States.DEFAULT
+            update = {"message": {"message_id": 1, "from": {"id": user_id}, "chat": {"id": user_id},
+                                  "text": random.choice(list(handlers.command_handlers))}}
+        else:
+            states[user_id] = States.GET_QUESTIONS_NUMBER
+            update = {"message": {"message_id": 1, "from": {"id": user_id}, "chat": {"id": user_id}, "text": "10"}}
+        update["update_id"] = update_id
+        updates.append(update)
+    return updates, states
+
+
+def build_router():
+    router = Router(value for name, value in vars(States).items() if not name.startswith('_'))
+    for text, command_handler in handlers.command_handlers.items():
+        router.add_command(text, noop, command_handler.get('state'))
+    for data in handlers.callback_handlers:
+        router.add_callback(data, noop)
+    for state in handlers.handlers:
+        router.add_state(state, noop)
+    router.add_callback_prefix(ANSWER_CALLBACK_PREFIX, noop, States.TEST_STATE, name='answer')
+    return router
+
+
+async def legacy_dispatch(states):
+    # dispatch из app.py до Update и Router
+    async def get_state(user_id):
+        return states.get(user_id)
+
+    msg_text = request.json.get('message', {}).get('text')
+    command_handler = handlers.command_handlers.get(msg_text)
+    if command_handler:
+        state = command_handler.get('state')
+        user_id = request.json['message']['from']['id']
+        cur_state = await get_state(user_id)
+        if state in {cur_state, None}:
+            await noop()
+            return
+
+    if request.json.get('callback_query'):
+        data = request.json['callback_query']['data']
+        if handlers.callback_handlers.get(data):
+            await noop()
+            return
+
+    user_id = None
+    if request.json.get('callback_query'):
+        user_id = request.json['callback_query']['from']['id']
+    if request.json.get('message'):
+        user_id = request.json['message']['from']['id']
+    cur_state = await get_state(user_id)
+    if handlers.handlers.get(cur_state):
+        await noop()
+
+
+async def measure_legacy(updates, states):
+    app = Flask(__name__)
+    started_at = time.perf_counter()
+    for update in updates:
+        with app.test_request_context(json=update):
+            await legacy_dispatch(states)
+    return time.perf_counter() - started_at
+
+
+async def measure_router(updates, states):
+    router = build_router()
+
+    async def get_state(user_id):
+        return states.get(user_id)
+
+    started_at = time.perf_counter()
+    for update in updates:
+        await router.dispatch(Update.parse(update), get_state)
+    elapsed = time.perf_counter() - started_at
+    return elapsed, router
+
+
+def measure_resolve(updates, states):
+    router = build_router()
+    parsed = [Update.parse(update) for update in updates]
+    parsed = [(update, states.get(update.user_id)) for update in parsed]
+    started_at = time.perf_counter()
+    for update, state in parsed:
+        router.resolve(update, state)
+    return time.perf_counter() - started_at
+
+
+async def main():
+    random.seed(1)
+    updates, states = make_updates()
+
+    legacy = await measure_legacy(updates, states)
+    routed, router = await measure_router(updates, states)
+    resolved = measure_resolve(updates, states)
+
+    print(f"обновлений: {len(updates)}")
+    print(f"прежний dispatch (с контекстом запроса Flask): {legacy / len(updates) * 1e6:.2f} мкс на обновление")
+    print(f"Update.parse + Router.dispatch: {routed / len(updates) * 1e6:.2f} мкс на обновление")
+    print(f"Router.resolve: {resolved / len(updates) * 1e6:.2f} мкс на обновление")
+    print("маршруты:", router.stats())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
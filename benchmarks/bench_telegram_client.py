@@ -0,0 +1,106 @@
+# Задержка одного вызова sendMessage на локальной заглушке Telegram API:
+# прежний клиент (новый requests.post без сессии на каждое сообщение)
+# против TelegramBot (одна aiohttp-сессия с keep-alive).
+#
+# Запуск из корня проекта: python -m benchmarks.bench_telegram_client
+# Заглушка работает по HTTP, поэтому TLS-рукопожатие, которое экономит keep-alive
+# при работе с api.telegram.org, в замер не входит: реальный выигрыш больше.
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+import requests
+from aiohttp import web
+
+from TelegramBotAPI import TelegramBot
+
+STUB_HOST = '127.0.0.1'
+STUB_PORT = 8997
+API_URL = f'http://{STUB_HOST}:{STUB_PORT}'
+CALLS = 500
+CONCURRENCY = 50
+
+
+async def stub_handler(web_request):
+    await web_request.post()
+    return web.json_response({"ok": True, "result": {"message_id": 1, "chat": {"id": 1}}})
+
+
+def run_stub(ready):
+    loop = asyncio.new_event_loop()
+    web_app = web.Application()
+    web_app.router.add_post('/{path:.*}', stub_handler)
+    runner = web.AppRunner(web_app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, STUB_HOST, STUB_PORT).start())
+    ready.set()
+    loop.run_forever()
+
+
+def send_with_requests(chat_id):
+    # Прежний TelegramBot.sendMessage
+    data = {
+        "chat_id": chat_id,
+        "text": "benchmark",
+        "reply_markup": json.dumps({"inline_keyboard": [[{"text": "a", "callback_data": "a"}]]})
+    }
+    requests.post(f'{API_URL}/bottest/sendMessage', data=data)
+
+
+def measure_requests():
+    timings = []
+    for chat_id in range(CALLS):
+        start = time.perf_counter()
+        send_with_requests(chat_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def measure_bot(concurrency):
+    # Лимиты Telegram отключены: измеряется только сам клиент
+    bot = TelegramBot('test', rate_limit=1_000_000, chat_rate_limit=1_000_000, api_url=API_URL)
+    reply_markup = {"inline_keyboard": [[{"text": "a", "callback_data": "a"}]]}
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def send(chat_id):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await bot.sendMessage(chat_id, "benchmark", reply_markup)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert result["message_id"] == 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(chat_id) for chat_id in range(CALLS)))
+    elapsed = time.perf_counter() - start
+    await bot.close()
+    return timings, elapsed
+
+
+def report(name, timings, elapsed):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<28} | {statistics.median(timings):>10.2f} | {p95:>8.2f} | {CALLS / elapsed:>10.0f}")
+
+
+def main():
+    ready = threading.Event()
+    threading.Thread(target=run_stub, args=(ready,), daemon=True).start()
+    ready.wait()
+
+    print(f"{'client':<28} | {'median, ms':>10} | {'p95, ms':>8} | {'calls/s':>10}")
+    start = time.perf_counter()
+    timings = measure_requests()
+    report("requests.post (before)", timings, time.perf_counter() - start)
+
+    timings, elapsed = asyncio.run(measure_bot(1))
+    report("TelegramBot, sequential", timings, elapsed)
+
+    timings, elapsed = asyncio.run(measure_bot(CONCURRENCY))
+    report(f"TelegramBot, {CONCURRENCY} concurrent", timings, elapsed)
+
+
+if __name__ == '__main__':
+    main()
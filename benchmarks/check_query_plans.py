@@ -0,0 +1,182 @@
+# Проверка планов запросов всех методов Database на большом наборе данных.
+# Каждый метод вызывается с подменённым курсором: вместо выполнения запроса
+# строится его план (EXPLAIN), и проверка падает, если в плане есть
+# последовательное сканирование большой таблицы.
+#
+# Запуск из корня проекта после миграций (python migrate.py):
+#     python -m benchmarks.check_query_plans
+# Данные создаются в одной транзакции и откатываются в конце, БД не изменяется.
+import contextlib
+import inspect
+import io
+import sys
+
+import psycopg2
+
+from config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from Database import Database
+
+TOPICS_NUMBER = 200
+WORDS_IN_TOPIC = 1000
+USERS_NUMBER = 20_000
+LEARNING_WORDS_PER_USER = 25
+TEST_WORDS_PER_USER = 5
+FIRST_USER_ID = 1_000_000_000
+
+LARGE_TABLES = {"users", "words", "learning", "test"}
+
+# Методы, которым полное сканирование нужно по смыслу
+ALLOWED_SEQ_SCANS = {
+    "get_words_translations": "загружает весь словарь в индекс вариантов ответа",
+    "get_fake_words_for_test": "при первом вызове загружает индекс вариантов ответа",
+}
+
+
+def seed(cursor):
+    cursor.execute("INSERT INTO topics (title) "
+                   "SELECT 'check ' || i FROM generate_series(1, %s) AS i", (TOPICS_NUMBER,))
+    cursor.execute("INSERT INTO words (topic_id, word, word_translation, usage_example) "
+                   "SELECT topics.id, 'word ' || i, 'слово ' || i, 'example ' || i "
+                   "FROM topics CROSS JOIN generate_series(1, %s) AS i "
+                   "WHERE topics.title LIKE 'check %%' "
+                   "ORDER BY topics.id, i", (WORDS_IN_TOPIC,))
+    cursor.execute("CREATE TEMPORARY TABLE check_topics ON COMMIT DROP AS "
+                   "SELECT topic_id, MIN(words.id) AS first_word_id, "
+                   "ROW_NUMBER() OVER (ORDER BY topic_id) - 1 AS number "
+                   "FROM words JOIN topics ON topics.id = words.topic_id "
+                   "WHERE topics.title LIKE 'check %%' GROUP BY topic_id")
+    # Напоминание ещё не отправлено лишь небольшой части пользователей
+    cursor.execute("INSERT INTO users (id, topic_id, questions_number, correct_answers_number, "
+                   "last_repeat, is_reminder_send) "
+                   "SELECT %(first_user_id)s + i, check_topics.topic_id, 5, 5, "
+                   "NOW() - random() * INTERVAL '30 days', random() < 0.98 "
+                   "FROM generate_series(0, %(users_number)s - 1) AS i "
+                   "JOIN check_topics ON check_topics.number = i %% %(topics_number)s",
+                   {"first_user_id": FIRST_USER_ID, "users_number": USERS_NUMBER, "topics_number": TOPICS_NUMBER})
+    for table, words_per_user, columns in [
+        ("learning", LEARNING_WORDS_PER_USER,
+         "correct_answers_number, last_repeat) SELECT users.id, {word_id}, floor(random() * 7), NOW()"),
+        ("test", TEST_WORDS_PER_USER,
+         "is_right) SELECT users.id, {word_id}, NULL"),
+    ]:
+        word_id = f"check_topics.first_word_id + ((users.id - {FIRST_USER_ID}) * 7 + i * 37) % {WORDS_IN_TOPIC}"
+        cursor.execute(f"INSERT INTO {table} (user_id, word_id, {columns.format(word_id=word_id)} "
+                       f"FROM users JOIN check_topics ON check_topics.topic_id = users.topic_id "
+                       f"CROSS JOIN generate_series(1, {words_per_user}) AS i "
+                       f"WHERE users.id >= {FIRST_USER_ID}")
+    for table in LARGE_TABLES:
+        cursor.execute(f"ANALYZE {table}")
+
+    cursor.execute("SELECT users.id, users.topic_id, check_topics.first_word_id FROM users "
+                   "JOIN check_topics ON check_topics.topic_id = users.topic_id "
+                   "WHERE users.id = %s", (FIRST_USER_ID + 1,))
+    return cursor.fetchone()
+
+
+class ExplainCursor:
+    # Вместо выполнения запроса сохраняет его план
+    def __init__(self, cursor, plans):
+        self.cursor = cursor
+        self.plans = plans
+
+    def execute(self, query, data=None):
+        self.cursor.execute("EXPLAIN (FORMAT JSON) " + query, data)
+        self.plans.append((query, self.cursor.fetchone()[0][0]["Plan"]))
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+def find_seq_scans(plan):
+    relations = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        relations.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        relations += find_seq_scans(child)
+    return relations
+
+
+def main():
+    connection = psycopg2.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database=DB_NAME)
+    cursor = connection.cursor()
+    user_id, topic_id, word_id = seed(cursor)
+
+    arguments = {
+        "user_id": user_id,
+        "word_id": word_id,
+        "topic_id": topic_id,
+        "state": 0,
+        "questions_number": 5,
+        "correct_answers_number": 5,
+        "is_right": True,
+        "is_reminder_send": True,
+        "title": "check",
+        "description": "check",
+        "word": "check",
+        "word_translation": "проверка",
+        "intervals": (0, 0, 2, 2, 2),
+        "word_ids": [word_id, word_id + 1],
+        "user_ids": [user_id, user_id + 1],
+        "interval": 30,
+    }
+
+    plans = []
+
+    @contextlib.contextmanager
+    def explain_cursor():
+        yield ExplainCursor(cursor, plans)
+
+    db = Database(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME)
+    db._cursor = explain_cursor
+
+    failed = False
+    for name, method in inspect.getmembers(db, inspect.ismethod):
+        if name.startswith('_'):
+            continue
+
+        kwargs = {}
+        parameters = inspect.signature(method).parameters.values()
+        missing = [parameter.name for parameter in parameters
+                   if parameter.default is parameter.empty and parameter.name not in arguments
+                   and parameter.kind != parameter.VAR_KEYWORD]
+        if missing:
+            print(f"FAIL {name}: нет тестового значения для аргументов {', '.join(missing)}")
+            failed = True
+            continue
+        for parameter in parameters:
+            if parameter.kind == parameter.VAR_KEYWORD:
+                # Изменяемые поля пользователя (update_user и подобные)
+                kwargs.update(state=0, is_reminder_send=False)
+            elif parameter.name in arguments:
+                kwargs[parameter.name] = arguments[parameter.name]
+        if name in {"save_test", "finish_test"}:
+            kwargs["is_right"] = [True, None]
+
+        plans.clear()
+        db.distractors.invalidate()
+        db.users.clear()
+        # Методы печатают ошибки разбора пустых результатов подменённого курсора
+        with contextlib.redirect_stdout(io.StringIO()):
+            method(**kwargs)
+
+        seq_scans = sorted({relation for _, plan in plans for relation in find_seq_scans(plan)})
+        if not plans:
+            print(f"  -  {name}: без запросов к БД")
+        elif seq_scans and name in ALLOWED_SEQ_SCANS:
+            print(f"  ok {name}: Seq Scan on {', '.join(seq_scans)} ({ALLOWED_SEQ_SCANS[name]})")
+        elif seq_scans:
+            print(f"FAIL {name}: Seq Scan on {', '.join(seq_scans)}")
+            failed = True
+        else:
+            print(f"  ok {name}")
+
+    connection.rollback()
+    connection.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
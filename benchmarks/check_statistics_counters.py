@@ -0,0 +1,162 @@
+# Проверка счётчиков статистики на случайных историях: после каждой серии случайных операций
+# (ответы, удаление прогресса, смена порога выученного слова, перенос и удаление слов, удаление пользователей)
+# счётчики из user_topic_statistics и topics.words_number сравниваются с полным пересчётом.
+# Операции, для которых есть методы Database, выполняются ими с подменённым курсором (как в check_query_plans),
+# остальные - запросами напрямую. Отдельно проверяются счётчики ответов теста в TestSession.
+#
+# Запуск из корня проекта после миграций (python migrate.py):
+#     python -m benchmarks.check_statistics_counters [seed]
+# Данные создаются в одной транзакции и откатываются в конце, БД не изменяется.
+import contextlib
+import random
+import sys
+
+import psycopg2
+
+from config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from Database import Database
+from test_session import Question, TestSession
+
+TOPICS_NUMBER = 5
+WORDS_NUMBER = 200
+USERS_NUMBER = 30
+OPERATIONS_NUMBER = 5000
+CHECK_EVERY = 250
+FIRST_USER_ID = 1_500_000_000
+
+
+def seed(db, cursor):
+    cursor.execute("INSERT INTO topics (title) SELECT 'counters ' || i FROM generate_series(1, %s) AS i "
+                   "RETURNING id", (TOPICS_NUMBER,))
+    topic_ids = [row[0] for row in cursor.fetchall()]
+    word_ids = [add_word(db, cursor, random.choice(topic_ids)) for _ in range(WORDS_NUMBER)]
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + USERS_NUMBER))
+    for user_id in user_ids:
+        add_user(db, user_id, random.choice(topic_ids))
+    return topic_ids, word_ids, user_ids
+
+
+def add_word(db, cursor, topic_id):
+    db.add_word(topic_id, 'word', 'слово')
+    cursor.execute("SELECT MAX(id) FROM words")
+    return cursor.fetchone()[0]
+
+
+def add_user(db, user_id, topic_id):
+    db.add_user(user_id)
+    db.update_user(user_id, topic_id=topic_id, correct_answers_number=random.randint(1, 6))
+
+
+def run_operation(db, cursor, topic_ids, word_ids, user_ids):
+    operation = random.random()
+    user_id = random.choice(user_ids)
+    word_id = random.choice(word_ids)
+    if operation < 0.65:
+        db.record_answer(user_id, word_id, random.random() < 0.8)
+    elif operation < 0.72:
+        cursor.execute("INSERT INTO learning (user_id, word_id, correct_answers_number, last_repeat) "
+                       "VALUES (%s, %s, %s, NOW()) ON CONFLICT (user_id, word_id) DO UPDATE "
+                       "SET correct_answers_number = EXCLUDED.correct_answers_number",
+                       (user_id, word_id, random.randint(0, 8)))
+    elif operation < 0.77:
+        cursor.execute("DELETE FROM learning WHERE user_id = %s AND word_id = %s", (user_id, word_id))
+    elif operation < 0.83:
+        threshold = random.choice([None, 1, 2, 3, 4, 5, 6])
+        if threshold is None:
+            # Database не записывает None в поля пользователя
+            cursor.execute("UPDATE users SET correct_answers_number = NULL WHERE id = %s", (user_id,))
+            db.users.invalidate(user_id)
+        else:
+            db.set_user_correct_answers_number(user_id, threshold)
+    elif operation < 0.89:
+        cursor.execute("UPDATE words SET topic_id = %s WHERE id = %s", (random.choice(topic_ids), word_id))
+    elif operation < 0.94:
+        word_ids.append(add_word(db, cursor, random.choice(topic_ids)))
+    elif operation < 0.97:
+        cursor.execute("DELETE FROM learning WHERE word_id = %s", (word_id,))
+        cursor.execute("DELETE FROM test WHERE word_id = %s", (word_id,))
+        cursor.execute("DELETE FROM words WHERE id = %s", (word_id,))
+        word_ids.remove(word_id)
+    else:
+        cursor.execute("DELETE FROM learning WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM test WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        db.users.invalidate(user_id)
+        add_user(db, user_id, random.choice(topic_ids))
+
+
+def find_mismatches(cursor, topic_ids):
+    cursor.execute("SELECT user_id, topic_id, learned_words_number FROM user_topic_statistics "
+                   "WHERE user_id >= %s AND learned_words_number <> 0", (FIRST_USER_ID,))
+    counters = {(user_id, topic_id): number for user_id, topic_id, number in cursor.fetchall()}
+    cursor.execute("SELECT learning.user_id, words.topic_id, COUNT(*) FROM learning "
+                   "JOIN users ON users.id = learning.user_id JOIN words ON words.id = learning.word_id "
+                   "WHERE learning.user_id >= %s AND learning.correct_answers_number >= users.correct_answers_number "
+                   "GROUP BY learning.user_id, words.topic_id", (FIRST_USER_ID,))
+    recount = {(user_id, topic_id): number for user_id, topic_id, number in cursor.fetchall()}
+
+    mismatches = [f"learned words of user {user_id} in topic {topic_id}: "
+                  f"{counters.get((user_id, topic_id), 0)} != {recount.get((user_id, topic_id), 0)}"
+                  for user_id, topic_id in counters.keys() | recount.keys()
+                  if counters.get((user_id, topic_id), 0) != recount.get((user_id, topic_id), 0)]
+
+    cursor.execute("SELECT id, words_number, (SELECT COUNT(*) FROM words WHERE words.topic_id = topics.id) "
+                   "FROM topics WHERE id = ANY(%s)", (topic_ids,))
+    mismatches += [f"words in topic {topic_id}: {words_number} != {recount}"
+                   for topic_id, words_number, recount in cursor.fetchall() if words_number != recount]
+    return mismatches
+
+
+def check_test_session():
+    mismatches = []
+    for _ in range(200):
+        questions = [Question(word_id, 'word', 'слово', None, None, None, ['a', 'b', 'c'])
+                     for word_id in range(random.randint(0, 20))]
+        session = TestSession(1, questions)
+        for _ in range(random.randint(0, len(questions))):
+            session.answer(random.random() < 0.5)
+        recount = {is_right: session.results.count(is_right) for is_right in (True, False, None)}
+        if session.count_results() != recount:
+            mismatches.append(f"test session: {session.count_results()} != {recount}")
+    return mismatches
+
+
+def main():
+    random_seed = int(sys.argv[1]) if len(sys.argv) > 1 else random.randrange(1_000_000)
+    random.seed(random_seed)
+    print(f"seed {random_seed}")
+
+    connection = psycopg2.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database=DB_NAME)
+    cursor = connection.cursor()
+
+    @contextlib.contextmanager
+    def transaction_cursor():
+        yield cursor
+
+    # Методы Database выполняют запросы в той же транзакции, что и проверка
+    db = Database(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME)
+    db._cursor = transaction_cursor
+    topic_ids, word_ids, user_ids = seed(db, cursor)
+
+    mismatches = []
+    for operation_number in range(1, OPERATIONS_NUMBER + 1):
+        run_operation(db, cursor, topic_ids, word_ids, user_ids)
+        if operation_number % CHECK_EVERY == 0:
+            mismatches = find_mismatches(cursor, topic_ids)
+            if mismatches:
+                print(f"FAIL after {operation_number} operations")
+                break
+    mismatches += check_test_session()
+
+    connection.rollback()
+    connection.close()
+
+    for mismatch in mismatches[:20]:
+        print(f"  {mismatch}")
+    if not mismatches:
+        print(f"ok: {OPERATIONS_NUMBER} operations, counters match a full recount")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
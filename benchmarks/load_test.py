@@ -0,0 +1,413 @@
+# Нагрузочный тест обработки обновлений: синтетические потоки обновлений виртуальных пользователей
+# (/start, выбор темы, тест с ответами, статистика, кнопки напоминания) отправляются
+# в app.receive_update через тестовый клиент Flask. Ответы бота принимает локальная заглушка
+# Telegram Bot API, которая запоминает вызовы и клавиатуры. БД - локальный Postgres
+# со словарём из data.json, размноженным в SCALE раз.
+#
+# Запуск из корня проекта после миграций (python migrate.py):
+#     python -m benchmarks.load_test [число пользователей] [масштаб словаря]
+# Лимиты Telegram в тесте отключены, измеряется только бот.
+# Результаты дописываются в benchmarks/results/load_test.jsonl вместе с хешем коммита
+# и сравниваются с предыдущим запуском с теми же параметрами.
+# Пользователи и словарь теста удаляются из БД после замера.
+import asyncio
+import collections
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from aiohttp import web
+
+STUB_HOST = '127.0.0.1'
+STUB_PORT = 8996
+
+os.environ.setdefault('API_TOKEN', 'test')
+os.environ['TELEGRAM_API_URL'] = f'http://{STUB_HOST}:{STUB_PORT}'
+os.environ['TELEGRAM_RATE_LIMIT'] = '1000000'
+os.environ['TELEGRAM_CHAT_RATE_LIMIT'] = '1000000'
+os.environ['TELEGRAM_CHAT_BURST'] = '1000000'
+
+import app  # noqa: E402
+import import_words  # noqa: E402
+import metrics  # noqa: E402
+from handlers import db  # noqa: E402
+from states import States  # noqa: E402
+from test_session import ANSWER_CALLBACK_PREFIX  # noqa: E402
+from topic_catalog import TOPICS_PAGE_CALLBACK_PREFIX  # noqa: E402
+
+USERS_NUMBER = 200
+SCALE = 50
+FIRST_USER_ID = 1_800_000_000
+# Пользователи FIRST_USER_ID..FIRST_USER_ID + USERS_NUMBER_MAX удаляются из БД до и после теста
+USERS_NUMBER_MAX = 100_000
+TOPIC_PREFIX = 'load test'
+# Сколько вопросов отвечается во втором тесте, начатом из напоминания, перед досрочным завершением
+ANSWERS_BEFORE_FINISH = 3
+# Сколько методов Database выводится в отчёте
+DB_METHODS_SHOWN = 5
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'load_test.jsonl')
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data.json')
+
+
+class TelegramStub:
+    # Заглушка Telegram Bot API: считает вызовы по методам и запоминает
+    # последнюю inline-клавиатуру каждого чата вместе с сообщением, к которому она относится
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.keyboards = {}
+        self.message_ids = itertools.count(1)
+
+    async def handle(self, web_request):
+        method = web_request.match_info['method']
+        data = await web_request.post()
+        self.calls[method] += 1
+
+        result = True
+        if method == 'sendMessage':
+            result = {"message_id": next(self.message_ids), "chat": {"id": int(data['chat_id'])}}
+        message_id = result["message_id"] if isinstance(result, dict) else data.get('message_id')
+
+        reply_markup = json.loads(data['reply_markup']) if data.get('reply_markup') else None
+        if reply_markup and 'inline_keyboard' in reply_markup:
+            self.keyboards[int(data['chat_id'])] = (int(message_id), reply_markup['inline_keyboard'])
+        elif method in {'sendMessage', 'editMessageText'} and data.get('chat_id'):
+            self.keyboards.pop(int(data['chat_id']), None)
+        return web.json_response({"ok": True, "result": result})
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            web_app = web.Application()
+            web_app.router.add_post('/bot{token}/{method}', self.handle)
+            runner = web.AppRunner(web_app, access_log=None)
+            loop.run_until_complete(runner.setup())
+            loop.run_until_complete(web.TCPSite(runner, STUB_HOST, STUB_PORT).start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+
+
+class QueryCounter:
+    # Считает транзакции и запросы всех методов Database
+    def __init__(self, database):
+        self.transactions = 0
+        self.queries = 0
+        cursor = database._cursor
+        # Курсор для проверок самого теста, его запросы не учитываются
+        self.uncounted_cursor = cursor
+        counter = self
+
+        class CountingCursor:
+            def __init__(self, wrapped):
+                self.wrapped = wrapped
+
+            def execute(self, query, data=None):
+                counter.queries += 1
+                return self.wrapped.execute(query, data)
+
+            def __getattr__(self, name):
+                return getattr(self.wrapped, name)
+
+        @contextlib.contextmanager
+        def counting_cursor():
+            with cursor() as wrapped:
+                counter.transactions += 1
+                yield CountingCursor(wrapped)
+
+        database._cursor = counting_cursor
+
+
+def scaled_rows(scale):
+    with open(DATA_PATH, 'r', encoding='utf-8') as file:
+        topics = json.load(file)
+    for copy in range(scale):
+        for topic in topics:
+            for word in topic['words']:
+                yield (f"{TOPIC_PREFIX} {copy}: {topic['title']}", topic.get('description'), word['word'],
+                       word['translation'], word.get('usage_example'), word.get('usage_example_translation'))
+
+
+def seed(scale):
+    with db.database._cursor() as cursor:
+        result = import_words.import_words(cursor, scaled_rows(scale))
+    db.database.topics.invalidate()
+    db.database.distractors.invalidate()
+    return result
+
+
+def cleanup():
+    data = {"first_user_id": FIRST_USER_ID, "last_user_id": FIRST_USER_ID + USERS_NUMBER_MAX, "prefix": f"{TOPIC_PREFIX} %"}
+    with db.database._cursor() as cursor:
+        cursor.execute("DELETE FROM learning WHERE user_id BETWEEN %(first_user_id)s AND %(last_user_id)s", data)
+        cursor.execute("DELETE FROM test WHERE user_id BETWEEN %(first_user_id)s AND %(last_user_id)s", data)
+        cursor.execute("DELETE FROM users WHERE id BETWEEN %(first_user_id)s AND %(last_user_id)s", data)
+        cursor.execute("DELETE FROM words WHERE topic_id IN (SELECT id FROM topics WHERE title LIKE %(prefix)s)", data)
+        cursor.execute("DELETE FROM topics WHERE title LIKE %(prefix)s", data)
+    db.database.users.clear()
+    db.database.topics.invalidate()
+    db.database.distractors.invalidate()
+
+
+class VirtualUser:
+    # Сценарий одного пользователя. Каждый шаг возвращает следующее обновление
+    # по последнему ответу бота или None, если сценарий закончен
+    def __init__(self, user_id, stub, get_state):
+        self.user_id = user_id
+        self.stub = stub
+        self.get_state = get_state
+        # Перешёл ли пользователь в состояние теста после "Начать тест"
+        self.reached_test = False
+        self.steps = self.scenario()
+
+    def message(self, text):
+        return {"message": {"message_id": 1, "from": {"id": self.user_id}, "chat": {"id": self.user_id}, "text": text}}
+
+    def callback(self, data, message_id):
+        return {"callback_query": {"id": str(self.user_id), "from": {"id": self.user_id},
+                                   "message": {"message_id": message_id, "chat": {"id": self.user_id}}, "data": data}}
+
+    def keyboard(self):
+        return self.stub.keyboards.get(self.user_id, (None, []))
+
+    def question(self):
+        # Клавиатура вопроса: кнопки ответов, закодированные encode_answer
+        message_id, inline_keyboard = self.keyboard()
+        buttons = [button["callback_data"] for row in inline_keyboard for button in row]
+        if buttons and buttons[0].startswith(ANSWER_CALLBACK_PREFIX):
+            return message_id, buttons
+        return None, None
+
+    def scenario(self):
+        yield "start", self.message('/start')
+        yield "topics", self.message('/topic')
+        message_id, inline_keyboard = self.keyboard()
+        navigation = [button["callback_data"] for button in inline_keyboard[-1]
+                      if button["callback_data"].startswith(TOPICS_PAGE_CALLBACK_PREFIX)]
+        if navigation:
+            yield "topics page", self.callback(navigation[-1], message_id)
+            message_id, inline_keyboard = self.keyboard()
+        # Только кнопки тем: на последней странице ряд навигации может идти сразу после первого ряда тем
+        topics = [button["callback_data"] for row in inline_keyboard for button in row
+                  if not button["callback_data"].startswith(TOPICS_PAGE_CALLBACK_PREFIX)]
+        yield "topic", self.callback(topics[self.user_id % len(topics)], message_id)
+
+        yield "start test", self.message('✍ Начать тест')
+        self.reached_test = self.get_state(self.user_id) == States.TEST_STATE
+        message_id, buttons = self.question()
+        while buttons:
+            yield "answer", self.callback(buttons[self.user_id % len(buttons)], message_id)
+            message_id, buttons = self.question()
+        yield "statistics", self.message('📊 Статистика')
+
+        # Кнопки напоминания: отложить, затем пройти тест и завершить его досрочно
+        yield "defer reminder", self.callback('Отложить напоминание на 30 мин.', 1)
+        yield "reminder test", self.callback('Пройти тест', 1)
+        for _ in range(ANSWERS_BEFORE_FINISH):
+            message_id, buttons = self.question()
+            if not buttons:
+                break
+            yield "answer", self.callback(buttons[0], message_id)
+        yield "finish test", self.message('🏁 Досрочно завершить тест')
+
+    def next_update(self):
+        return next(self.steps, None)
+
+
+class LoadTest:
+    def __init__(self, users_number):
+        self.stub = TelegramStub()
+        self.queries = QueryCounter(db.database)
+        self.client = app.app.test_client()
+        self.update_ids = itertools.count(1)
+        self.users = [VirtualUser(FIRST_USER_ID + number, self.stub, self.get_state) for number in range(users_number)]
+
+        self.posted_at = {}
+        self.latencies = collections.defaultdict(list)
+        self.handler_times = []
+        process_update = app.update_queue.process_update
+
+        async def timed_process_update(update):
+            started_at = time.perf_counter()
+            try:
+                await process_update(update)
+            finally:
+                finished_at = time.perf_counter()
+                self.handler_times.append(finished_at - started_at)
+                kind, posted_at = self.posted_at.pop(update.update_id)
+                self.latencies[kind].append(finished_at - posted_at)
+
+        app.update_queue.process_update = timed_process_update
+
+    def post(self, kind, update):
+        update['update_id'] = next(self.update_ids)
+        self.posted_at[update['update_id']] = (kind, time.perf_counter())
+        response = self.client.post('/', json=update)
+        assert response.status_code == 200, response.status_code
+
+    def get_state(self, user_id):
+        with self.queries.uncounted_cursor() as cursor:
+            cursor.execute("SELECT state FROM users WHERE id = %s", (user_id,))
+            row = cursor.fetchone()
+        return row and row[0]
+
+    def wait(self):
+        while app.update_queue.size:
+            time.sleep(0.001)
+
+    def run(self):
+        # Шаги идут раундами: в раунде каждый активный пользователь отправляет одно обновление,
+        # следующий раунд начинается после обработки всех обновлений
+        # (следующий шаг пользователя зависит от ответа бота)
+        self.stub.start()
+        app.get_flask_loop()
+        updates_number = 0
+        started_at = time.perf_counter()
+        active = list(self.users)
+        while active:
+            next_active = []
+            for user in active:
+                step = user.next_update()
+                if step is None:
+                    continue
+                self.post(*step)
+                updates_number += 1
+                next_active.append(user)
+            self.wait()
+            active = next_active
+        elapsed = time.perf_counter() - started_at
+
+        # Иначе замер относится не к тому сценарию
+        not_tested = [user.user_id for user in self.users if not user.reached_test]
+        assert not not_tested, f"не перешли в состояние теста: {len(not_tested)} пользователей, например {not_tested[0]}"
+        return updates_number, elapsed
+
+
+def percentiles(values) -> dict:
+    if len(values) < 2:
+        values = values * 2 or [0.0, 0.0]
+    quantiles = statistics.quantiles(values, n=100, method='inclusive')
+    return {"p50": quantiles[49] * 1000, "p95": quantiles[94] * 1000, "p99": quantiles[98] * 1000}
+
+
+def db_methods_summary() -> dict:
+    # Методы Database по убыванию p99, затем суммарного времени
+    histogram = metrics.DB_METHOD_SECONDS
+    summary = {}
+    for labels in histogram.labels():
+        count = histogram.count(*labels)
+        summary[labels[0]] = {
+            "p99": histogram.quantile(0.99, *labels) * 1000,
+            "mean": histogram.total(*labels) / count * 1000,
+            "total": histogram.total(*labels) * 1000,
+            "count": count,
+        }
+    return dict(sorted(summary.items(), key=lambda item: (item[1]["p99"], item[1]["total"]), reverse=True))
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_result(result):
+    # Предыдущий результат с теми же параметрами для сравнения
+    previous = None
+    if os.path.exists(RESULTS_PATH):
+        with open(RESULTS_PATH, 'r', encoding='utf-8') as file:
+            for line in file:
+                saved = json.loads(line)
+                if saved["users"] == result["users"] and saved["scale"] == result["scale"]:
+                    previous = saved
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return previous
+
+
+def print_result(result, previous):
+    def compare(key, value):
+        if previous is None or not previous.get(key):
+            return ""
+        return f" ({(value - previous[key]) / previous[key] * 100:+.1f}% к {previous['commit']})"
+
+    print(f"пользователей {result['users']}, масштаб словаря {result['scale']}, "
+          f"обновлений {result['updates']} за {result['elapsed']:.2f} с")
+    rows = [
+        ("updates_per_second", "обновлений в секунду", "{:.0f}"),
+        ("p50", "задержка p50, мс", "{:.2f}"),
+        ("p95", "задержка p95, мс", "{:.2f}"),
+        ("p99", "задержка p99, мс", "{:.2f}"),
+        ("handler_p50", "обработчик p50, мс", "{:.2f}"),
+        ("handler_p99", "обработчик p99, мс", "{:.2f}"),
+        ("queries_per_update", "запросов к БД на обновление", "{:.2f}"),
+        ("transactions_per_update", "транзакций на обновление", "{:.2f}"),
+        ("api_calls_per_update", "вызовов Telegram API на обновление", "{:.2f}"),
+    ]
+    for key, title, value_format in rows:
+        print(f"  {title}: {value_format.format(result[key])}{compare(key, result[key])}")
+
+    print("  задержка по видам обновлений, мс (p50 / p95 / p99):")
+    for kind, kind_percentiles in result["kinds"].items():
+        print(f"    {kind}: {kind_percentiles['p50']:.2f} / {kind_percentiles['p95']:.2f} / {kind_percentiles['p99']:.2f}")
+    print("  вызовы Telegram API:", ", ".join(f"{method} {number}" for method, number in result["api_calls"].items()))
+    print("  методы Database с наибольшим p99 (по корзинам bot_db_method_seconds), мс:")
+    for method, summary in list(result["db_methods"].items())[:DB_METHODS_SHOWN]:
+        print(f"    {method}: p99 <= {summary['p99']:.1f}, среднее {summary['mean']:.2f}, вызовов {summary['count']}")
+
+
+def main(users_number, scale):
+    cleanup()
+    try:
+        seed_result = seed(scale)
+        print(f"словарь: тем {seed_result['topics']}, слов {seed_result['words']}")
+
+        load_test = LoadTest(users_number)
+        updates_number, elapsed = load_test.run()
+        latencies = [latency for kind_latencies in load_test.latencies.values() for latency in kind_latencies]
+        handler_percentiles = percentiles(load_test.handler_times)
+        result = {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec='seconds'),
+            "users": users_number,
+            "scale": scale,
+            "updates": updates_number,
+            "elapsed": elapsed,
+            "updates_per_second": updates_number / elapsed,
+            **percentiles(latencies),
+            "handler_p50": handler_percentiles["p50"],
+            "handler_p99": handler_percentiles["p99"],
+            "queries_per_update": load_test.queries.queries / updates_number,
+            "transactions_per_update": load_test.queries.transactions / updates_number,
+            "api_calls_per_update": sum(load_test.stub.calls.values()) / updates_number,
+            "kinds": {kind: percentiles(kind_latencies) for kind, kind_latencies in load_test.latencies.items()},
+            "api_calls": dict(load_test.stub.calls.most_common()),
+            "failed": app.update_queue.failed,
+            "db_methods": db_methods_summary(),
+        }
+    finally:
+        cleanup()
+
+    previous = save_result(result)
+    print_result(result, previous)
+    if result["failed"]:
+        print(f"  ошибок при обработке обновлений: {result['failed']}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else USERS_NUMBER,
+         int(sys.argv[2]) if len(sys.argv) > 2 else SCALE)
@@ -3,9 +3,40 @@ import os
 # Bot and server config
 API_TOKEN = os.environ.get('API_TOKEN')
 WEB_HOOK_URL = os.environ.get('WEB_HOOK_URL')
-TELEGRAM_API_URL = f'https://api.telegram.org/bot{API_TOKEN}'
-APP_PORT = os.environ.get('APP_PORT')
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL') or 'https://api.telegram.org'
+APP_PORT = int(os.environ.get('APP_PORT') or 5000)
 APP_HOST = os.environ.get('APP_HOST')
+# aiohttp - асинхронный сервер, flask - запасной синхронный вариант,
+# polling - получение обновлений через getUpdates без webhook (например, за NAT)
+APP_SERVER = os.environ.get('APP_SERVER') or 'aiohttp'
+# getUpdates: сколько секунд Telegram держит запрос без новых обновлений, обновлений в одной пачке (до 100)
+POLLING_TIMEOUT = int(os.environ.get('POLLING_TIMEOUT') or 30)
+POLLING_LIMIT = int(os.environ.get('POLLING_LIMIT') or 100)
+# Лимиты Telegram: сообщений в секунду всего и в один чат, сообщений подряд в один чат
+TELEGRAM_RATE_LIMIT = float(os.environ.get('TELEGRAM_RATE_LIMIT') or 30)
+TELEGRAM_CHAT_RATE_LIMIT = float(os.environ.get('TELEGRAM_CHAT_RATE_LIMIT') or 1)
+TELEGRAM_CHAT_BURST = float(os.environ.get('TELEGRAM_CHAT_BURST') or 3)
+# Таймауты запросов к Telegram в секундах: установка соединения и ожидание ответа
+TELEGRAM_CONNECT_TIMEOUT = float(os.environ.get('TELEGRAM_CONNECT_TIMEOUT') or 5)
+TELEGRAM_READ_TIMEOUT = float(os.environ.get('TELEGRAM_READ_TIMEOUT') or 30)
+
+# Update queue config
+UPDATE_WORKERS_NUMBER = int(os.environ.get('UPDATE_WORKERS_NUMBER') or 8)
+UPDATE_QUEUE_SIZE = int(os.environ.get('UPDATE_QUEUE_SIZE') or 1000)
+
+# Reminder config
+# Через сколько минут после последнего теста отправляется напоминание
+REMINDER_INTERVAL = int(os.environ.get('REMINDER_INTERVAL') or 2)
+# Сколько напоминаний отправляется одновременно
+REMINDER_CONCURRENCY = int(os.environ.get('REMINDER_CONCURRENCY') or 10)
+
+# Topics config
+# Число тем на одной странице клавиатуры выбора темы
+TOPICS_PAGE_SIZE = int(os.environ.get('TOPICS_PAGE_SIZE') or 10)
+
+# Test config
+# Время жизни незавершённого теста в памяти, в секундах
+TEST_SESSION_TTL = int(os.environ.get('TEST_SESSION_TTL') or 86400)
 
 # Database config
 DB_USER = os.environ.get('DB_USER')
@@ -13,3 +44,12 @@ DB_PASSWORD = os.environ.get('DB_PASSWORD')
 DB_HOST = os.environ.get('DB_HOST')
 DB_PORT = os.environ.get('DB_PORT')
 DB_NAME = os.environ.get('DB_NAME')
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE') or 1)
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE') or 10)
+# Запросы к БД дольше порога (в миллисекундах) выводятся в лог, 0 - не выводятся
+SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD') or 100)
+# Кеш пользователей: число записей в памяти и время жизни записи в секундах
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 10000)
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 300)
+# Redis для согласования кеша между несколькими процессами бота (нужен пакет redis), например redis://localhost:6379/0
+USER_CACHE_REDIS_URL = os.environ.get('USER_CACHE_REDIS_URL')
@@ -0,0 +1,93 @@
+import random
+import threading
+import time
+
+
+class DistractorSampler:
+    # Индекс переводов слов в памяти для подбора неправильных вариантов ответа.
+    # load_words возвращает список (id, topic_id, word_translation) всех слов словаря
+    def __init__(self, load_words, prefer_same_topic: bool = True, max_age: float = 600.0):
+        self.load_words = load_words
+        self.prefer_same_topic = prefer_same_topic
+        # Через сколько секунд индекс перечитывается, даже если словарь не менялся в этом процессе
+        self.max_age = max_age
+
+        self.words = {}
+        self.topic_translations = {}
+        self.all_translations = []
+
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.max_age
+
+    def reload_if_stale(self):
+        if not self.is_stale():
+            return
+        with self.lock:
+            # Пока поток ждал блокировку, индекс мог перечитать другой поток
+            if self.is_stale():
+                self._load()
+
+    def reload_if_missing(self, word_id: int):
+        with self.lock:
+            if word_id not in self.words:
+                self._load()
+
+    def _load(self):
+        # Вызывается под блокировкой
+        words = {}
+        topic_translations = {}
+        all_translations = set()
+        for word_id, topic_id, word_translation in self.load_words() or []:
+            words[word_id] = (topic_id, word_translation)
+            topic_translations.setdefault(topic_id, set()).add(word_translation)
+            all_translations.add(word_translation)
+
+        self.words = words
+        self.topic_translations = {topic_id: list(translations)
+                                   for topic_id, translations in topic_translations.items()}
+        self.all_translations = list(all_translations)
+        self.loaded_at = time.monotonic()
+
+    def sample(self, word_id: int, number: int = 3) -> list[str]:
+        self.reload_if_stale()
+        if word_id not in self.words:
+            # Слово могло быть добавлено другим процессом
+            self.reload_if_missing(word_id)
+
+        topic_id, word_translation = self.words.get(word_id, (None, None))
+        translations = self.all_translations
+        if self.prefer_same_topic:
+            topic_translations = self.topic_translations.get(topic_id, [])
+            if len(topic_translations) > number:
+                translations = topic_translations
+
+        return self._sample_distinct(translations, word_translation, number)
+
+    def sample_many(self, word_ids: list[int], number: int = 3) -> list[list[str]]:
+        # Варианты ответа для всех вопросов теста
+        return [self.sample(word_id, number) for word_id in word_ids]
+
+    @staticmethod
+    def _sample_distinct(translations: list[str], exclude: str | None, number: int) -> list[str]:
+        # Случайные индексы с отбрасыванием повторов и правильного ответа:
+        # в среднем O(number) при любом размере словаря
+        result = []
+        attempts = number * 10
+        while len(result) < number and attempts and translations:
+            attempts -= 1
+            translation = random.choice(translations)
+            if translation != exclude and translation not in result:
+                result.append(translation)
+
+        if len(result) < number:
+            # Словарь слишком мал для случайных попыток
+            candidates = [translation for translation in translations
+                          if translation != exclude and translation not in result]
+            result += random.sample(candidates, min(number - len(result), len(candidates)))
+        return result
@@ -0,0 +1,64 @@
+import json
+import os
+import threading
+import time
+
+
+class ForgettingCurve:
+    # Кривая забывания из json-файла вида {"<кол-во правильных ответов>": <интервал в минутах>}.
+    # Хранится в памяти как кортеж интервалов, индексированный количеством правильных ответов
+    # (None - шаг отсутствует в кривой, слово считается выученным)
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        # Как часто (в секундах) проверять время изменения файла
+        self.check_interval = check_interval
+        self.intervals = ()
+        self.reloads = 0
+
+        self.mtime = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+        self.reload_if_changed()
+
+    def reload_if_changed(self):
+        with self.lock:
+            self.checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self.mtime:
+                    return
+
+                with open(self.path, 'r') as file:
+                    conf_file = json.load(file)
+
+                steps = {int(correct_answers_number): interval for correct_answers_number, interval in conf_file.items()}
+                intervals = [None] * (max(steps, default=-1) + 1)
+                for correct_answers_number, interval in steps.items():
+                    intervals[correct_answers_number] = interval
+            except (OSError, ValueError) as error:
+                # Остаётся прежняя кривая, файл будет перечитан при следующей проверке
+                print("Ошибка при загрузке кривой забывания.", error)
+                return
+
+            # Новая кривая подменяет старую одним присваиванием
+            self.intervals = tuple(intervals)
+            self.mtime = mtime
+            self.reloads += 1
+
+    def get_intervals(self) -> tuple[int | None, ...]:
+        if time.monotonic() - self.checked_at >= self.check_interval:
+            self.reload_if_changed()
+        return self.intervals
+
+    def get_interval(self, correct_answers_number: int) -> int | None:
+        intervals = self.get_intervals()
+        if 0 <= correct_answers_number < len(intervals):
+            return intervals[correct_answers_number]
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "reloads": self.reloads,
+            "intervals": len(self.intervals),
+        }
@@ -1,421 +1,394 @@
 import asyncio
 import datetime
-import json
-import random
 
-from flask import request
-
-from config import API_TOKEN, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from config import (API_TOKEN, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+                    USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_REDIS_URL, TOPICS_PAGE_SIZE,
+                    TEST_SESSION_TTL, REMINDER_INTERVAL, REMINDER_CONCURRENCY, TELEGRAM_RATE_LIMIT,
+                    TELEGRAM_CHAT_RATE_LIMIT, TELEGRAM_CHAT_BURST, TELEGRAM_API_URL, TELEGRAM_CONNECT_TIMEOUT,
+                    TELEGRAM_READ_TIMEOUT, SLOW_QUERY_THRESHOLD)
 from TelegramBotAPI import TelegramBot
-from Database import Database
+from Database import Database, AsyncDatabase
+from forgetting_curve import ForgettingCurve
+from reminder_scheduler import ReminderScheduler
+from router import Router
+from test_session import ANSWER_CALLBACK_PREFIX, Question, TestSession, TestSessionCache, decode_answer, encode_answer
+from topic_catalog import TOPICS_PAGE_CALLBACK_PREFIX
+from update import Update
 
 from keyboards_menu import *
 from states import States
 
-bot = TelegramBot(API_TOKEN)
-db = Database(db_user=DB_USER, db_password=DB_PASSWORD, db_host=DB_HOST, db_port=DB_PORT, db_name=DB_NAME)
+bot = TelegramBot(API_TOKEN, rate_limit=TELEGRAM_RATE_LIMIT, chat_rate_limit=TELEGRAM_CHAT_RATE_LIMIT,
+                  chat_burst=TELEGRAM_CHAT_BURST, connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+                  read_timeout=TELEGRAM_READ_TIMEOUT, api_url=TELEGRAM_API_URL)
+db = AsyncDatabase(Database(db_user=DB_USER, db_password=DB_PASSWORD, db_host=DB_HOST, db_port=DB_PORT,
+                            db_name=DB_NAME, min_connections=DB_POOL_MIN_SIZE, max_connections=DB_POOL_MAX_SIZE,
+                            user_cache_size=USER_CACHE_SIZE, user_cache_ttl=USER_CACHE_TTL,
+                            user_cache_redis_url=USER_CACHE_REDIS_URL, topics_page_size=TOPICS_PAGE_SIZE,
+                            slow_query_threshold=SLOW_QUERY_THRESHOLD / 1000 if SLOW_QUERY_THRESHOLD else None))
+# Кривая забывания загружается один раз и перечитывается при изменении файла
+forgetting_curve = ForgettingCurve('config.json')
+# Тесты пользователей, которые сейчас проходятся
+test_sessions = TestSessionCache(ttl=TEST_SESSION_TTL)
 
 
 # Напоминание
 async def main():
-    while True:
-        await reminder()
-        await asyncio.sleep(60)
+    await reminders.run()
 
 
-async def reminder():
-    users = db.get_all_users_to_send_reminder(2)
-    if users is None:
-        return
+async def sendReminder(user_id):
+    # None - сообщение не отправлено
+    chat_id = user_id
+    text = "🔔 Пора пройти тест!"
+    reply_markup = reminder_inline_keyboard_markup
+    return await bot.sendMessage(chat_id, text, reply_markup, priority=bot.PRIORITY_LOW)
 
-    for user in users:
-        user_id = user[0]
-        chat_id = user[0]
-        text = "🔔 Пора пройти тест!"
-        reply_markup = reminder_inline_keyboard_markup
-        bot.sendMessage(chat_id, text, reply_markup)
 
-        db.set_is_reminder_send(user_id, True)
+# Очередь напоминаний по времени последнего прохождения теста
+reminders = ReminderScheduler(db, sendReminder, interval=REMINDER_INTERVAL, concurrency=REMINDER_CONCURRENCY)
 
 
 # Основа бота
-def start():
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
-    if not db.get_user_by_id(user_id):
-        db.add_user(user_id)
+async def start(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
     text = "Привет! 👋 Я чат-бот для изучения английских слов."
     reply_markup = start_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup)
+    await bot.sendMessage(chat_id, text, reply_markup)
 
-    db.set_state(user_id=user_id, state=States.DEFAULT)
-    db.clear_test(user_id)
-    db.set_is_reminder_send(user_id, False)
+    test_sessions.pop(user_id)
+    context = await db.reset_user(user_id, state=States.DEFAULT, is_reminder_send=False)
+    reminders.schedule(user_id, context and context.last_repeat)
 
 
-def startTest():
-    if request.json.get('callback_query'):
-        chat_id = request.json['callback_query']['message']['chat']['id']
-        user_id = request.json['callback_query']['from']['id']
-        message_id = request.json['callback_query']['message']['message_id']
-
-        bot.deleteMessage(chat_id, message_id)
-    else:
-        chat_id = request.json['message']['chat']['id']
-        user_id = request.json['message']['from']['id']
+async def startTest(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
     text = "🔄 Подбор вопросов для теста..."
-    bot.sendMessage(chat_id, text)
+    if update.is_callback:
+        # Напоминание заменяется сообщением о подборе вопросов
+        await asyncio.gather(bot.answerCallbackQuery(update.callback_query_id),
+                             bot.editMessageText(chat_id, update.message_id, text))
+    else:
+        await bot.sendMessage(chat_id, text)
 
-    questions_number = genQuestions(user_id)
+    questions_number = await genQuestions(user_id)
 
     if questions_number == 0:
         text = ("❌ Не удалось подобрать вопросы.\n"
                 "Попробуйте выбрать другую тему или подождать.")
-        bot.sendMessage(chat_id, text)
+        await bot.sendMessage(chat_id, text)
 
         return
 
     text = (f"<b>Всего вопросов в тесте:</b> {questions_number}\n\n"
             f"Удачи!")
     reply_markup = startTest_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
-    newQuestion(chat_id, user_id)
+    await newQuestion(update)
 
-    db.set_state(user_id=user_id, state=States.TEST_STATE)
+    await db.set_state(user_id=user_id, state=States.TEST_STATE)
 
 
-def genQuestions(user_id):
-    # Кол-во вопросов в тесте
-    questions_number = 0
-    # Получение параметра пользователя с максимальным кол-вом вопросов в тесте
-    max_questions_number = db.get_user_questions_number(user_id)
-    # Получение слов заданной всех слов заданной темы
-    all_words = db.get_words_for_questions(user_id)
-
-    # Список выученных слов
-    learned_words = []
+async def genQuestions(user_id):
+    # Подбор слов для теста по кривой забывания выполняется в БД
+    test_words = await db.select_words_for_test(user_id, forgetting_curve.get_intervals())
 
     # Если нет слов для теста
-    if len(all_words) == 0:
-        return questions_number
-
-    # Получение кривой забывания из json-файла
-    with open('config.json', 'r') as file:
-        conf_file = json.load(file)
-
-    # Подбор слов для теста
-    for word_id, correct_answers_number, last_repeat in all_words:
-        interval = 0
-        # Если слово уже изучалось
-        if correct_answers_number is not None:
-            interval = conf_file.get(f"{correct_answers_number}")
-        # Если слово вышло за кривую забывания (выучено)
-        if interval is None:
-            learned_words.append(word_id)
-            continue
-
-        # Если ещё не пришло время для повторения
-        if last_repeat is not None and datetime.datetime.now()-last_repeat < datetime.timedelta(minutes=interval):
-            continue
+    if not test_words:
+        return 0
 
-        # Иначе добавляем слово в список вопросов для теста
-        db.add_word_in_test(user_id, word_id)
+    # Весь тест (слова, варианты ответов) собирается один раз и хранится в памяти до завершения
+    fake_words = await db.get_fake_words_for_test([test_word[0] for test_word in test_words])
+    questions = []
+    for (word_id, word, word_translation, usage_example, usage_example_translation,
+         correct_answers_number), fake_translations in zip(test_words, fake_words):
+        questions.append(Question(word_id, word, word_translation, usage_example, usage_example_translation,
+                                  correct_answers_number, fake_translations))
+    test_sessions.set(user_id, TestSession(user_id, questions))
 
-        questions_number += 1
+    return len(questions)
 
-        # Если необходимое кол-во слов подобрано
-        if questions_number >= max_questions_number:
-            break
 
-    # Если слов не хватает,
-    # то добираем из числа изученных
-    if questions_number < max_questions_number:
-        missing_words = random.sample(learned_words, min(len(learned_words), max_questions_number-questions_number))
-        for word_id in missing_words:
-            db.add_word_in_test(user_id, word_id)
-
-            questions_number += 1
-
-    return questions_number
-
-
-def testing():
-    if not request.json.get('callback_query'):
+async def testing(update: Update):
+    if not update.is_callback:
         return
 
-    chat_id = request.json['callback_query']['message']['chat']['id']
-    message_id = request.json['callback_query']['message']['message_id']
-    user_id = request.json['callback_query']['from']['id']
-    user_answer = request.json['callback_query']['data']
+    chat_id, user_id, message_id = update.chat_id, update.user_id, update.message_id
+    callback_query_id = update.callback_query_id
 
-    user_answer_word_id, user_answer_word_translation = user_answer.split()
+    session = test_sessions.get(user_id)
+    if session is None:
+        text = "⌛ Тест не найден или устарел. Начните новый тест."
+        reply_markup = start_reply_keyboard_markup
+        await asyncio.gather(bot.answerCallbackQuery(callback_query_id),
+                             bot.editMessageReplyMarkup(chat_id, message_id),
+                             bot.sendMessage(chat_id, text, reply_markup))
 
-    bot.deleteMessage(chat_id, message_id)
-
-    word_obj = db.get_word_by_id_from_test(user_id, user_answer_word_id)
-    if word_obj is None:
+        await db.set_state(user_id=user_id, state=States.DEFAULT)
         return
 
-    word_id, word, word_translation = db.get_word_by_id_from_test(user_id, user_answer_word_id)
-
-    if user_answer_word_translation == word_translation:
-        text = (f"Ваш ответ: <b>{user_answer_word_translation}</b>\n"
-                f"✅ Правильно")
-        bot.sendMessage(chat_id, text, parse_mode='HTML')
+    # Ответ на вопрос другого теста или на вопрос, который уже не является текущим, игнорируется
+    answer = decode_answer(update.callback_data)
+    question = session.get_question()
+    if (answer is None or question is None or answer[0] != session.session_id or answer[1] != session.current
+            or answer[2] >= len(question.answers)):
+        await bot.answerCallbackQuery(callback_query_id)
+        return
 
-        word_correct_answers_number = db.get_correct_answers_number_from_learning(user_id, word_id)
-        if word_correct_answers_number is None:
-            db.add_learning(user_id, word_id, 1)
-        else:
-            db.update_learning(user_id, word_id, word_correct_answers_number + 1)
+    option_index = answer[2]
+    word_id, word_translation = question.word_id, question.word_translation
+    user_answer_word_translation = question.answers[option_index]
 
-        db.set_is_right_in_test(user_id, word_id, True)
+    if option_index == question.correct_option:
+        verdict = (f"Ваш ответ: <b>{user_answer_word_translation}</b>\n"
+                   f"✅ Правильно")
+        is_right = True
     else:
-        text = (f"Ваш ответ: <b>{user_answer_word_translation}</b>\n"
-                f"❌ Неправильно\n\n"
-                f"Правильный ответ:\n"
-                f"<tg-spoiler><b>{word_translation}</b></tg-spoiler>")
-        bot.sendMessage(chat_id=chat_id, text=text, parse_mode='HTML')
-
-        word_correct_answers_number = db.get_correct_answers_number_from_learning(user_id, word_id)
-        if word_correct_answers_number is None:
-            db.add_learning(user_id, word_id, 0)
-        else:
-            db.update_learning(user_id, word_id, 0)
-
-        db.set_is_right_in_test(user_id, word_id, False)
-
-    newQuestion(chat_id, user_id)
-
-
-def newQuestion(chat_id, user_id):
-    word_obj = db.get_word_from_test(user_id)
-    if word_obj is None:
-        finishTest()
+        verdict = (f"Ваш ответ: <b>{user_answer_word_translation}</b>\n"
+                   f"❌ Неправильно\n\n"
+                   f"Правильный ответ:\n"
+                   f"<tg-spoiler><b>{word_translation}</b></tg-spoiler>")
+        is_right = False
+
+    question.correct_answers_number = await db.record_answer(user_id, word_id, is_right)
+    session.answer(is_right)
+
+    # Итог ответа и следующий вопрос показываются в том же сообщении
+    await asyncio.gather(bot.answerCallbackQuery(callback_query_id),
+                         newQuestion(update, message_id, verdict))
+
+
+async def newQuestion(update: Update, message_id=None, verdict=None):
+    # message_id - сообщение с предыдущим вопросом, которое заменяется итогом ответа и новым вопросом
+    chat_id, user_id = update.chat_id, update.user_id
+    session = test_sessions.get(user_id)
+    question = session and session.get_question()
+    if question is None:
+        if message_id is not None and verdict:
+            await bot.editMessageText(chat_id, message_id, verdict, parse_mode='HTML')
+        await finishTest(update)
         return
-    word_id, word, word_translation = word_obj
-    fakeAnswers = db.get_fake_words_for_question(word_id)
 
-    answers = [word_translation, *fakeAnswers]
-    random.shuffle(answers)
-    text = f"Как переводится слово <b>{word}</b>?"
-    inline_keyboard = [{"text": f"{answer}", "callback_data": f"{word_id} {answer}"} for answer in answers]
+    text = f"Как переводится слово <b>{question.word}</b>?"
+    if verdict:
+        text = f"{verdict}\n\n{text}"
+    inline_keyboard = [{"text": f"{answer}", "callback_data": encode_answer(session.session_id, session.current, option_index)}
+                       for option_index, answer in enumerate(question.answers)]
     reply_markup = {
-        "inline_keyboard": [inline_keyboard[i:i + 2] for i in range(0, len(answers), 2)]
+        "inline_keyboard": [inline_keyboard[i:i + 2] for i in range(0, len(question.answers), 2)]
     }
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    if message_id is not None:
+        if await bot.editMessageText(chat_id, message_id, text, reply_markup, parse_mode='HTML') is not None:
+            return
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
 
-def finishTest():
-    if request.json.get('callback_query'):
-        chat_id = request.json['callback_query']['message']['chat']['id']
-        user_id = request.json['callback_query']['from']['id']
-    else:
-        chat_id = request.json['message']['chat']['id']
-        user_id = request.json['message']['from']['id']
+async def finishTest(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
+
+    session = test_sessions.pop(user_id)
 
     text = "Тест завершен 🎉"
     reply_markup = start_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup)
+    await bot.sendMessage(chat_id, text, reply_markup)
+
+    await testStatistic(chat_id, session)
 
-    testStatistic(chat_id, user_id)
+    # Результаты теста записываются в БД один раз, при завершении
+    word_ids, results = [], []
+    if session is not None:
+        word_ids = [question.word_id for question in session.questions]
+        results = session.results
 
-    db.set_state(user_id=user_id, state=States.DEFAULT)
-    db.clear_test(user_id)
-    db.set_user_last_repeat(user_id)
-    db.set_is_reminder_send(user_id, False)
+    context = await db.finish_test(user_id, word_ids, results, state=States.DEFAULT,
+                                   last_repeat=datetime.datetime.now(), is_reminder_send=False)
+    reminders.schedule(user_id, context and context.last_repeat)
 
 
-def testStatistic(chat_id, user_id):
-    grouped_words = dict(db.get_is_right_grouped_words(user_id))
+async def testStatistic(chat_id, session):
+    grouped_words = {True: 0, False: 0, None: 0}
+    if session is not None:
+        grouped_words = session.count_results()
 
     text = (f"<b>Правильные ответы</b> - {grouped_words.get(True, 0)}\n"
             f"<b>Неправильные ответы</b> - {grouped_words.get(False, 0)}\n"
             f"<b>Без ответа</b> - {grouped_words.get(None, 0)}\n\n"
             f"<b>Всего вопросов</b> - {sum(grouped_words.values())}")
-    bot.sendMessage(chat_id, text, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, parse_mode='HTML')
 
 
-def usageExample():
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
+async def usageExample(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
-    usageExamples = db.get_word_usage_example_from_test(user_id)
+    session = test_sessions.get(user_id)
+    question = session and session.get_question()
+    usageExamples = (question.usage_example, question.usage_example_translation) if question else (None, None)
 
     text = (f"<b>Пример использования на английском языке:</b>\n"
             f"\"{usageExamples[0] or '-'}\"\n\n"
             f"<b>Пример использования на русском языке:</b>\n"
             f"<tg-spoiler>\"{usageExamples[1] or '-' }\"</tg-spoiler>")
-    bot.sendMessage(chat_id=chat_id, text=text, parse_mode="HTML")
+    await bot.sendMessage(chat_id=chat_id, text=text, parse_mode="HTML")
 
 
-def statictics():
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
+async def statictics(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
-    learned_word_number = db.get_learned_word_number(user_id)
-    word_number_in_topic = db.get_word_number_in_topic(user_id)
-    user_last_repeat = db.get_user_last_repeat(user_id)
+    context = await db.get_user_context(user_id, statistics=True)
+    learned_word_number = context and context.learned_word_number
+    word_number_in_topic = context and context.word_number_in_topic
+    user_last_repeat = context and context.last_repeat
 
     text = (f"<b>Статистика пользователя</b>\n\n"
             f"<b>Выучено слов:</b> {learned_word_number or 0}\n"
             f"<b>Количество слов в выбранной теме:</b> {word_number_in_topic or 0}\n"
             f"<b>Последнее прохождение теста:</b>\n{user_last_repeat and user_last_repeat.strftime('%H:%M   %d.%m.%Y') or '-'}")
-    bot.sendMessage(chat_id=chat_id, text=text, parse_mode="HTML")
+    await bot.sendMessage(chat_id=chat_id, text=text, parse_mode="HTML")
 
 
-def paramsSetting():
-    chat_id = request.json['message']['chat']['id']
+async def paramsSetting(update: Update):
+    chat_id = update.chat_id
 
     text = "Настройка параметров теста. Настройка производится через меню ↙"
-    bot.sendMessage(chat_id, text)
+    await bot.sendMessage(chat_id, text)
 
 
-def backToMain():
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
+async def backToMain(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
     text = "🏠 Главная. Что вы хотите сделать?"
     reply_markup = start_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup)
+    await bot.sendMessage(chat_id, text, reply_markup)
 
-    db.set_state(user_id=user_id, state=States.DEFAULT)
+    await db.set_state(user_id=user_id, state=States.DEFAULT)
 
 
-def setTopic():
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
+async def setTopic(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
-    title, description = db.get_user_topic(user_id)
+    context = await db.get_user_context(user_id)
+    if context is None:
+        return
 
     text = (f"Выбор темы для изучения.\n\n"
-            f"<b>Текущая тема:</b> {title}\n"
-            f"<b>Описание:</b> {description}")
+            f"<b>Текущая тема:</b> {context.topic_title}\n"
+            f"<b>Описание:</b> {context.topic_description}")
     reply_markup = setTopic_reply_keyboard
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
-    topics = db.get_topics()
     text = f"Выберите тему из предложенных:"
-    inline_keyboard = [{"text": f"{title}", "callback_data": f"{topic_id}"} for topic_id, title in topics]
-    reply_markup = {
-        "inline_keyboard": [inline_keyboard[i:i+2] for i in range(0, len(topics), 2)]
-    }
-    bot.sendMessage(chat_id, text, reply_markup)
+    reply_markup = await db.get_topic_keyboard()
+    await bot.sendMessage(chat_id, text, reply_markup)
 
-    db.set_state(user_id=user_id, state=States.GET_TOPIC)
+    await db.set_state(user_id=user_id, state=States.GET_TOPIC)
 
 
-def getTopic():
-    if not request.json.get('callback_query'):
-        chat_id = request.json['message']['chat']['id']
-        bot.sendMessage(chat_id, "Выберите тему для изучения!")
+async def getTopic(update: Update):
+    chat_id = update.chat_id
+    if not update.is_callback:
+        await bot.sendMessage(chat_id, "Выберите тему для изучения!")
         return
 
-    chat_id = request.json['callback_query']['message']['chat']['id']
-    message_id = request.json['callback_query']['message']['message_id']
-    user_id = request.json['callback_query']['from']['id']
-    topic_id = request.json['callback_query']['data']
+    user_id, message_id, callback_query_id = update.user_id, update.message_id, update.callback_query_id
+    topic_id = update.callback_data
+
+    # Переключение страницы клавиатуры выбора темы
+    if topic_id.startswith(TOPICS_PAGE_CALLBACK_PREFIX):
+        page = topic_id[len(TOPICS_PAGE_CALLBACK_PREFIX):]
+        reply_markup = await db.get_topic_keyboard(int(page) if page.isdigit() else 0)
+        await asyncio.gather(bot.answerCallbackQuery(callback_query_id),
+                             bot.editMessageReplyMarkup(chat_id, message_id, reply_markup))
+        return
 
-    bot.deleteMessage(chat_id, message_id)
+    await asyncio.gather(bot.answerCallbackQuery(callback_query_id),
+                         bot.deleteMessage(chat_id, message_id))
 
-    db.set_user_topic(user_id, topic_id)
-    db.set_state(user_id=user_id, state=States.DEFAULT)
+    context = await db.update_user(user_id, topic_id=topic_id, state=States.DEFAULT)
+    if context is None:
+        return
 
-    title, description = db.get_user_topic(user_id)
-    text = (f"<b>Новая тема:</b> {title}\n"
-            f"<b>Описание:</b> {description}")
+    text = (f"<b>Новая тема:</b> {context.topic_title}\n"
+            f"<b>Описание:</b> {context.topic_description}")
     reply_markup = start_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
 
-def setQuestionsNumber():
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
+async def setQuestionsNumber(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
-    questions_number = db.get_user_questions_number(user_id)
+    questions_number = await db.get_user_questions_number(user_id)
 
     text = (f"Настройка количества слов в тесте.\n\n"
             f"<b>Текущее значение:</b> {questions_number}\n\n"
             f"Отправьте новое значение в сообщении.")
     reply_markup = setQuestionsNumber_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
-    db.set_state(user_id=user_id, state=States.GET_QUESTIONS_NUMBER)
+    await db.set_state(user_id=user_id, state=States.GET_QUESTIONS_NUMBER)
 
 
-def getQuestionsNumber():
-    if not request.json.get('message'):
-        chat_id = request.json['callback_query']['message']['chat']['id']
-        bot.sendMessage(chat_id, "Введите количество вопросов!")
+async def getQuestionsNumber(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
+    if update.is_callback:
+        await bot.sendMessage(chat_id, "Введите количество вопросов!")
         return
 
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
-    questions_number = request.json['message']['text']
+    questions_number = update.text
 
-    if not questions_number.isdigit():
-        bot.sendMessage(chat_id, "Введенное значение не является числом!")
+    if not questions_number or not questions_number.isdigit():
+        await bot.sendMessage(chat_id, "Введенное значение не является числом!")
         return
 
-    db.set_user_questions_number(user_id, int(questions_number))
-    db.set_state(user_id=user_id, state=States.DEFAULT)
-
-    questions_number = db.get_user_questions_number(user_id)
-    text = f"<b>Новое количество вопросов:</b> {questions_number}\n"
+    context = await db.update_user(user_id, questions_number=int(questions_number), state=States.DEFAULT)
+    text = f"<b>Новое количество вопросов:</b> {context and context.questions_number}\n"
     reply_markup = start_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
 
-def setCorrectAnswersNumber():
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
+async def setCorrectAnswersNumber(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
-    correct_answers_number = db.get_user_correct_answers_number(user_id)
+    correct_answers_number = await db.get_user_correct_answers_number(user_id)
 
     text = (f"Настройка количества правильных ответов для того, чтобы слово считалось выученным.\n\n"
             f"<b>Текущее значение:</b> {correct_answers_number}\n\n"
             f"Отправьте новое значение в сообщении.")
     reply_markup = setCorrectAnswersNumber_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
-    db.set_state(user_id=user_id, state=States.GET_CORRECT_ANSWERS_NUMBER)
+    await db.set_state(user_id=user_id, state=States.GET_CORRECT_ANSWERS_NUMBER)
 
 
-def getCorrectAnswersNumber():
-    if not request.json.get('message'):
-        chat_id = request.json['callback_query']['message']['chat']['id']
-        bot.sendMessage(chat_id, "Введите количество правильных ответов!")
+async def getCorrectAnswersNumber(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
+    if update.is_callback:
+        await bot.sendMessage(chat_id, "Введите количество правильных ответов!")
         return
 
-    chat_id = request.json['message']['chat']['id']
-    user_id = request.json['message']['from']['id']
-    correct_answers_number = request.json['message']['text']
+    correct_answers_number = update.text
 
-    if not correct_answers_number.isdigit():
-        bot.sendMessage(chat_id, "Введенное значение не является числом!")
+    if not correct_answers_number or not correct_answers_number.isdigit():
+        await bot.sendMessage(chat_id, "Введенное значение не является числом!")
         return
 
-    db.set_user_correct_answers_number(user_id, int(correct_answers_number))
-    db.set_state(user_id=user_id, state=States.DEFAULT)
-
-    correct_answers_number = db.get_user_correct_answers_number(user_id)
-    text = f"<b>Новое количество правильных ответов для того, чтобы слово считалось выученным:</b> {correct_answers_number}\n"
+    context = await db.update_user(user_id, correct_answers_number=int(correct_answers_number), state=States.DEFAULT)
+    text = (f"<b>Новое количество правильных ответов для того, чтобы слово считалось выученным:</b> "
+            f"{context and context.correct_answers_number}\n")
     reply_markup = start_reply_keyboard_markup
-    bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
+    await bot.sendMessage(chat_id, text, reply_markup, parse_mode='HTML')
 
 
-def deferReminder():
-    chat_id = request.json['callback_query']['message']['chat']['id']
-    message_id = request.json['callback_query']['message']['message_id']
-    user_id = request.json['callback_query']['from']['id']
+async def deferReminder(update: Update):
+    chat_id, user_id = update.chat_id, update.user_id
 
-    bot.deleteMessage(chat_id, message_id)
+    await asyncio.gather(bot.answerCallbackQuery(update.callback_query_id, "⏰ Напоминание отложено"),
+                         bot.deleteMessage(chat_id, update.message_id))
 
-    db.set_user_last_repeat(user_id)
-    db.set_is_reminder_send(user_id, False)
+    context = await db.update_user(user_id, last_repeat=datetime.datetime.now(), is_reminder_send=False)
+    reminders.schedule(user_id, context and context.last_repeat)
 
 
 command_handlers = {
@@ -444,3 +417,16 @@ handlers = {
     States.GET_CORRECT_ANSWERS_NUMBER: getCorrectAnswersNumber,
     States.TEST_STATE: testing
 }
+
+
+# Таблицы обработчиков, собранные в маршрутизатор
+router = Router(value for name, value in vars(States).items() if not name.startswith('_'))
+for text, command_handler in command_handlers.items():
+    router.add_command(text, command_handler['handler'], command_handler.get('state'))
+for data, callback_handler in callback_handlers.items():
+    router.add_callback(data, callback_handler)
+for state, state_handler in handlers.items():
+    router.add_state(state, state_handler)
+# Ответ на вопрос теста и переключение страницы выбора темы
+router.add_callback_prefix(ANSWER_CALLBACK_PREFIX, testing, States.TEST_STATE, name='answer')
+router.add_callback_prefix(TOPICS_PAGE_CALLBACK_PREFIX, getTopic, States.GET_TOPIC, name='topicsPage')
@@ -0,0 +1,271 @@
+import csv
+import json
+import os
+import sys
+import time
+
+import psycopg2
+
+from config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+
+# Колонки строки словаря в порядке промежуточной таблицы
+WORD_COLUMNS = ("topic_title", "topic_description", "word", "word_translation",
+                "usage_example", "usage_example_translation")
+# Заголовки колонок CSV/TSV-файла и соответствующие им колонки словаря
+CSV_COLUMNS = {
+    "topic": "topic_title",
+    "topic_description": "topic_description",
+    "word": "word",
+    "translation": "word_translation",
+    "usage_example": "usage_example",
+    "usage_example_translation": "usage_example_translation",
+}
+CHUNK_SIZE = 1 << 16
+IMPORT_WORK_MEM = '256MB'
+
+
+class JsonStream:
+    # Последовательный разбор JSON-файла: в памяти только текущий фрагмент файла
+    # и разбираемое значение, а не весь документ
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Неожиданный конец JSON-файла")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Ожидался символ {char!r}, получен {self.buffer[self.pos]!r}")
+        self.pos += 1
+
+    def items(self, close: str):
+        # Перебирает элементы массива или объекта после открывающей скобки
+        if self.peek() == close:
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == close:
+                return
+            if char != ',':
+                raise ValueError(f"Ожидался символ ',' или {close!r}, получен {char!r}")
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Число в конце фрагмента может продолжаться в следующем
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def read_json(path):
+    # Файл в формате data.json: [{"title", "description", "words": [{"word", "translation", ...}]}]
+    with open(path, 'r', encoding='utf-8') as file:
+        stream = JsonStream(file)
+        stream.expect('[')
+        for _ in stream.items(']'):
+            stream.expect('{')
+            topic = {}
+            # Слова, которые встретились в файле раньше названия темы
+            words = []
+            for _ in stream.items('}'):
+                key = stream.decode()
+                stream.expect(':')
+                if key != 'words':
+                    topic[key] = stream.decode()
+                    continue
+
+                stream.expect('[')
+                for _ in stream.items(']'):
+                    word = stream.decode()
+                    if 'title' in topic:
+                        yield json_word_row(topic, word)
+                    else:
+                        words.append(word)
+
+            for word in words:
+                yield json_word_row(topic, word)
+
+
+def json_word_row(topic, word) -> tuple:
+    return (topic.get('title'), topic.get('description'), word.get('word'), word.get('translation'),
+            word.get('usage_example'), word.get('usage_example_translation'))
+
+
+def read_csv(path, delimiter=','):
+    # Первая строка файла - заголовки из CSV_COLUMNS, колонки topic, word и translation обязательны
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        header = next(reader, [])
+        columns = {CSV_COLUMNS[name.strip()]: index for index, name in enumerate(header) if name.strip() in CSV_COLUMNS}
+        for required in ("topic_title", "word", "word_translation"):
+            if required not in columns:
+                raise ValueError(f"В файле {path} нет колонки {required}")
+
+        for row in reader:
+            yield tuple(row[columns[column]] or None if column in columns and columns[column] < len(row) else None
+                        for column in WORD_COLUMNS)
+
+
+def read_words(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        return read_json(path)
+    if extension == '.csv':
+        return read_csv(path)
+    if extension in {'.tsv', '.tab'}:
+        return read_csv(path, delimiter='\t')
+    raise ValueError(f"Неизвестный формат файла {path}")
+
+
+def copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class CopyStream:
+    # Файлоподобный объект для COPY FROM STDIN: строки словаря переводятся в текстовый формат COPY
+    # по мере чтения, поэтому файл словаря не загружается в память целиком
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+        self.rows_number = 0
+        self.skipped = 0
+
+    def read(self, size=CHUNK_SIZE):
+        lines = [self.buffer]
+        length = len(self.buffer)
+        while length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            # Строки без темы, слова или перевода не загружаются
+            if not (row[0] and row[2] and row[3]):
+                self.skipped += 1
+                continue
+            line = "\t".join(copy_value(value) for value in row) + "\n"
+            lines.append(line)
+            length += len(line)
+            self.rows_number += 1
+
+        data = "".join(lines)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def import_words(cursor, rows) -> dict:
+    # Загружает строки словаря в текущей транзакции:
+    # COPY во временную таблицу, затем по одному INSERT ... SELECT для тем и слов.
+    # Темы ищутся по названию среди общих тем (user_id IS NULL), слова - по паре (тема, слово).
+    # Дубликаты в файле и уже загруженные слова пропускаются
+    started_at = time.monotonic()
+    # Сортировки для удаления дубликатов выполняются в памяти, а не во временных файлах
+    cursor.execute(f"SET LOCAL work_mem = '{IMPORT_WORK_MEM}'")
+    cursor.execute("CREATE TEMPORARY TABLE import_words ( "
+                   "number bigint GENERATED ALWAYS AS IDENTITY, "
+                   "topic_title varchar, topic_description varchar, word varchar, word_translation varchar, "
+                   "usage_example varchar, usage_example_translation varchar) ON COMMIT DROP")
+    stream = CopyStream(rows)
+    cursor.copy_expert(f"COPY import_words ({', '.join(WORD_COLUMNS)}) FROM STDIN", stream)
+    copied_at = time.monotonic()
+
+    cursor.execute("INSERT INTO topics (title, description) "
+                   "SELECT DISTINCT ON (topic_title) topic_title, topic_description "
+                   "FROM import_words "
+                   "WHERE NOT EXISTS (SELECT 1 FROM topics WHERE topics.title = import_words.topic_title AND topics.user_id IS NULL) "
+                   "ORDER BY topic_title, number")
+    topics_number = cursor.rowcount
+
+    cursor.execute("CREATE TEMPORARY TABLE import_topics ON COMMIT DROP AS "
+                   "SELECT DISTINCT ON (title) title, id FROM topics WHERE user_id IS NULL ORDER BY title, id")
+    cursor.execute("ANALYZE import_words")
+    cursor.execute("INSERT INTO words (topic_id, word, word_translation, usage_example, usage_example_translation) "
+                   "SELECT topic_id, word, word_translation, usage_example, usage_example_translation "
+                   "FROM (SELECT DISTINCT ON (import_topics.id, import_words.word) import_topics.id AS topic_id, "
+                   "import_words.word, word_translation, usage_example, usage_example_translation, number "
+                   "FROM import_words JOIN import_topics ON import_topics.title = import_words.topic_title "
+                   "ORDER BY import_topics.id, import_words.word, number) AS new_words "
+                   "WHERE NOT EXISTS (SELECT 1 FROM words WHERE words.topic_id = new_words.topic_id AND words.word = new_words.word) "
+                   "ORDER BY number")
+    words_number = cursor.rowcount
+    finished_at = time.monotonic()
+
+    return {
+        "rows": stream.rows_number,
+        "skipped": stream.skipped,
+        "topics": topics_number,
+        "words": words_number,
+        "duplicates": stream.rows_number - words_number,
+        "copy_time": copied_at - started_at,
+        "insert_time": finished_at - copied_at,
+        "total_time": finished_at - started_at,
+    }
+
+
+def main(paths):
+    connection = psycopg2.connect(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME
+    )
+    try:
+        for path in paths:
+            # Каждый файл загружается одной транзакцией: при ошибке файл не загружается совсем
+            with connection, connection.cursor() as cursor:
+                result = import_words(cursor, read_words(path))
+            rows_per_second = result["rows"] / result["total_time"] if result["total_time"] else 0.0
+            print(f"{path}: строк {result['rows']}, пропущено {result['skipped']}, "
+                  f"новых тем {result['topics']}, новых слов {result['words']}, "
+                  f"дубликатов {result['duplicates']}")
+            print(f"    COPY {result['copy_time']:.2f} с, вставка {result['insert_time']:.2f} с, "
+                  f"{rows_per_second:.0f} строк/с")
+    except (Exception, psycopg2.Error) as error:
+        print("Ошибка при загрузке словаря.", error)
+        sys.exit(1)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    # python import_words.py data.json [words.csv words.tsv ...]
+    # Запущенные процессы бота увидят новые темы и слова при следующем обновлении
+    # каталога тем и индекса переводов (раз в 10 минут)
+    if len(sys.argv) < 2:
+        print("Использование: python import_words.py <файл.json|.csv|.tsv> ...")
+        sys.exit(2)
+    main(sys.argv[1:])
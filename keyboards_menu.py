@@ -1,47 +1,55 @@
+import json
+
+
+def serialize_markup(reply_markup: dict) -> str:
+    # Разметка сериализуется один раз при загрузке модуля, TelegramBot передаёт строку без json.dumps
+    return json.dumps(reply_markup)
+
+
 # Кнопки клавиатуры
-start_reply_keyboard_markup = {
+start_reply_keyboard_markup = serialize_markup({
     "keyboard": [
         ["✍ Начать тест", "📊 Статистика", "🛠 Настройка параметров"]
     ],
     "resize_keyboard": True
-}
+})
 
-startTest_reply_keyboard_markup = {
+startTest_reply_keyboard_markup = serialize_markup({
     "keyboard": [
         ["🏁 Досрочно завершить тест", "📘 Пример использования"]
     ],
     "resize_keyboard": True
-}
+})
 
-setTopic_reply_keyboard = {
+setTopic_reply_keyboard = serialize_markup({
     "keyboard": [
         ["❌ Отменить настройку темы"]
     ],
     "resize_keyboard": True
-}
+})
 
-setQuestionsNumber_reply_keyboard_markup = {
+setQuestionsNumber_reply_keyboard_markup = serialize_markup({
     "keyboard": [
         ["❌ Отменить настройку количества вопросов"]
     ],
     "resize_keyboard": True,
     "input_field_placeholder": "Введите количество вопросов"
-}
+})
 
-setCorrectAnswersNumber_reply_keyboard_markup = {
+setCorrectAnswersNumber_reply_keyboard_markup = serialize_markup({
     "keyboard": [
         ["❌ Отменить настройку количества правильных ответов"]
     ],
     "resize_keyboard": True,
     "input_field_placeholder": "Введите количество правильных ответов"
-}
+})
 
 # Inline-кнопки
-reminder_inline_keyboard_markup = {
+reminder_inline_keyboard_markup = serialize_markup({
     "inline_keyboard": [
         [{"text": "✍ Пройти тест", "callback_data": "Пройти тест"}],
         [{"text": "⏰ Отложить напоминание на 30 мин.", "callback_data": "Отложить напоминание на 30 мин."}]
     ]
-}
+})
 
 # Команды меню
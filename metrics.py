@@ -0,0 +1,208 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+# Границы корзин гистограмм задержек в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    labels = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return f"{{{labels}}}"
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, value=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    # Гистограмма в формате Prometheus: число наблюдений не больше каждой границы, сумма и количество
+    def __init__(self, name, description, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики корзин (последняя - +Inf), сумма]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            item = self.values.get(labels)
+            if item is None:
+                item = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            item[0][index] += 1
+            item[1] += value
+
+    def count(self, *labels) -> int:
+        item = self.values.get(labels)
+        return sum(item[0]) if item else 0
+
+    def total(self, *labels) -> float:
+        item = self.values.get(labels)
+        return item[1] if item else 0.0
+
+    def quantile(self, q, *labels) -> float | None:
+        # Верхняя граница корзины, в которую попадает квантиль q (оценка сверху, как histogram_quantile)
+        item = self.values.get(labels)
+        if not item:
+            return None
+        counts = item[0]
+        rank = q * sum(counts)
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return None
+
+    def labels(self) -> list[tuple]:
+        return list(self.values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            values = sorted((labels, list(item[0]), item[1]) for labels, item in self.values.items())
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = format_labels((*self.label_names, "le"), (*labels, bound))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        # Значения stats() компонентов бота, которые выводятся как gauge при каждом запросе /metrics
+        self.collectors = []
+
+    def counter(self, name, description, label_names=()) -> Counter:
+        metric = Counter(name, description, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, description, label_names=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, prefix, stats):
+        # stats() возвращает словарь, числовые значения выводятся как <prefix>_<ключ>
+        self.collectors.append((prefix, stats))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for prefix, stats in self.collectors:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+DB_METHOD_SECONDS = registry.histogram('bot_db_method_seconds', 'Время выполнения методов Database', ['method'])
+DB_METHOD_ERRORS = registry.counter('bot_db_method_errors_total', 'Ошибки БД в методах Database', ['method'])
+DB_SLOW_QUERIES = registry.counter('bot_db_slow_queries_total', 'Запросы к БД дольше порога', ['method'])
+TELEGRAM_REQUEST_SECONDS = registry.histogram('bot_telegram_request_seconds',
+                                              'Время вызовов Telegram Bot API, включая ожидание лимита',
+                                              ['method'])
+TELEGRAM_REQUEST_ERRORS = registry.counter('bot_telegram_request_errors_total',
+                                           'Вызовы Telegram Bot API, завершившиеся ошибкой', ['method'])
+HANDLER_SECONDS = registry.histogram('bot_handler_seconds', 'Время обработки обновления по маршрутам', ['route'])
+HANDLER_ERRORS = registry.counter('bot_handler_errors_total', 'Исключения в обработчиках по маршрутам', ['route'])
+
+# Имя выполняемого метода в текущем потоке, для ошибок и медленных запросов внутри метода
+current = threading.local()
+
+
+def current_operation() -> str | None:
+    return getattr(current, 'operation', None)
+
+
+def instrument(name, method, histogram, errors, is_error=None):
+    # is_error(result) - признак ошибки для методов, которые не выбрасывают исключения.
+    # errors=None - ошибки считает сам метод (например, Database._cursor)
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                result = await method(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(name)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started_at, name)
+            if is_error is not None and is_error(result):
+                errors.inc(name)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        previous = current_operation()
+        current.operation = name
+        started_at = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            if errors is not None:
+                errors.inc(name)
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started_at, name)
+            current.operation = previous
+        if is_error is not None and is_error(result):
+            errors.inc(name)
+        return result
+
+    return wrapper
+
+
+def instrument_methods(cls, histogram, errors=None, is_error=None, exclude=()):
+    # Оборачивает все публичные методы класса замером времени и счётчиком ошибок
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or name in exclude or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, instrument(name, method, histogram, errors, is_error))
+    return cls
@@ -0,0 +1,52 @@
+import os
+
+import psycopg2
+
+from config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Ключ блокировки, чтобы миграции не применялись одновременно из нескольких процессов
+MIGRATIONS_LOCK_ID = 2024_0001
+
+
+def migrate():
+    # Применяет файлы migrations/NNN_*.sql по порядку номеров, каждый в своей транзакции.
+    # Применённые версии хранятся в таблице schema_migrations.
+    # Базовая схема создаётся из Script.sql
+    connection = psycopg2.connect(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME
+    )
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,))
+            cursor.execute("CREATE TABLE IF NOT EXISTS \"public\".schema_migrations ( "
+                           "version varchar NOT NULL, "
+                           "applied_at timestamp DEFAULT NOW() NOT NULL, "
+                           "CONSTRAINT pk_schema_migrations PRIMARY KEY ( version ))")
+            cursor.execute("SELECT version FROM \"public\".schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+
+        for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+            version, extension = os.path.splitext(file_name)
+            if extension != '.sql' or version in applied:
+                continue
+
+            with open(os.path.join(MIGRATIONS_DIR, file_name), 'r', encoding='utf-8') as file:
+                query = file.read()
+
+            with connection, connection.cursor() as cursor:
+                cursor.execute(query)
+                cursor.execute("INSERT INTO \"public\".schema_migrations (version) VALUES (%s)", (version,))
+            print(f"Применена миграция {version}")
+    finally:
+        with connection, connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_ID,))
+        connection.close()
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,17 @@
+-- Первичные ключи (user_id, word_id) для таблиц прогресса обучения и теста.
+-- Ответы обновляют строки по паре (user_id, word_id), без ключа это последовательное сканирование.
+
+-- Дубликаты могли появиться при одновременных ответах, остаётся самая свежая строка
+DELETE FROM "public".learning a
+USING "public".learning b
+WHERE a.user_id = b.user_id AND a.word_id = b.word_id
+  AND (a.last_repeat, a.ctid) < (b.last_repeat, b.ctid);
+
+ALTER TABLE "public".learning ADD CONSTRAINT pk_learning PRIMARY KEY ( user_id, word_id );
+
+DELETE FROM "public".test a
+USING "public".test b
+WHERE a.user_id = b.user_id AND a.word_id = b.word_id
+  AND a.ctid < b.ctid;
+
+ALTER TABLE "public".test ADD CONSTRAINT pk_test PRIMARY KEY ( user_id, word_id );
@@ -0,0 +1,10 @@
+-- Слова выбираются по теме при подборе теста и подсчёте статистики
+CREATE INDEX IF NOT EXISTS idx_words_topic_id ON "public".words ( topic_id );
+
+-- Поиск пользователей для напоминания: только те, кому напоминание ещё не отправлено
+CREATE INDEX IF NOT EXISTS idx_users_reminder_last_repeat ON "public".users ( last_repeat ) WHERE is_reminder_send = false;
+
+-- Индексы внешних ключей на words: без них удаление слова сканирует learning и test целиком
+CREATE INDEX IF NOT EXISTS idx_learning_word_id ON "public".learning ( word_id );
+
+CREATE INDEX IF NOT EXISTS idx_test_word_id ON "public".test ( word_id );
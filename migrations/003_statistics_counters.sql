@@ -0,0 +1,138 @@
+-- Счётчики для статистики пользователя, которые поддерживаются триггерами:
+-- число выученных слов пользователя по темам и число слов в теме.
+-- Экран статистики читает их вместо COUNT(*) по learning и words
+
+CREATE TABLE "public".user_topic_statistics (
+	user_id              integer  NOT NULL  ,
+	topic_id             integer  NOT NULL  ,
+	learned_words_number integer DEFAULT 0 NOT NULL  ,
+	CONSTRAINT pk_user_topic_statistics PRIMARY KEY ( user_id, topic_id )
+ );
+
+ALTER TABLE "public".topics ADD COLUMN words_number integer DEFAULT 0 NOT NULL;
+
+-- Изменяет число выученных слов пользователя в теме слова на delta
+CREATE FUNCTION "public".change_learned_words_number(p_user_id integer, p_word_id integer, delta integer)
+RETURNS void AS $$
+    INSERT INTO "public".user_topic_statistics (user_id, topic_id, learned_words_number)
+    SELECT p_user_id, topic_id, delta FROM "public".words WHERE id = p_word_id
+    ON CONFLICT (user_id, topic_id) DO UPDATE
+    SET learned_words_number = user_topic_statistics.learned_words_number + EXCLUDED.learned_words_number;
+$$ LANGUAGE sql;
+
+-- Пересчёт всех счётчиков пользователя, например после изменения числа ответов для выученного слова
+CREATE FUNCTION "public".recount_learned_words_number(p_user_id integer)
+RETURNS void AS $$
+    DELETE FROM "public".user_topic_statistics WHERE user_id = p_user_id;
+    INSERT INTO "public".user_topic_statistics (user_id, topic_id, learned_words_number)
+    SELECT learning.user_id, words.topic_id, COUNT(*)
+    FROM "public".learning
+    JOIN "public".users ON users.id = learning.user_id
+    JOIN "public".words ON words.id = learning.word_id
+    WHERE learning.user_id = p_user_id AND learning.correct_answers_number >= users.correct_answers_number
+    GROUP BY learning.user_id, words.topic_id;
+$$ LANGUAGE sql;
+
+-- Слово выучено, если число правильных ответов не меньше заданного пользователем
+CREATE FUNCTION "public".is_word_learned(p_user_id integer, p_correct_answers_number integer)
+RETURNS boolean AS $$
+    SELECT COALESCE(p_correct_answers_number >= users.correct_answers_number, false)
+    FROM "public".users WHERE id = p_user_id;
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION "public".learning_statistics_trigger()
+RETURNS trigger AS $$
+DECLARE
+    old_learned boolean := false;
+    new_learned boolean := false;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        old_learned := COALESCE("public".is_word_learned(OLD.user_id, OLD.correct_answers_number), false);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        new_learned := COALESCE("public".is_word_learned(NEW.user_id, NEW.correct_answers_number), false);
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.user_id = NEW.user_id AND OLD.word_id = NEW.word_id THEN
+        IF old_learned <> new_learned THEN
+            PERFORM "public".change_learned_words_number(NEW.user_id, NEW.word_id,
+                                                         CASE WHEN new_learned THEN 1 ELSE -1 END);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF old_learned THEN
+        PERFORM "public".change_learned_words_number(OLD.user_id, OLD.word_id, -1);
+    END IF;
+    IF new_learned THEN
+        PERFORM "public".change_learned_words_number(NEW.user_id, NEW.word_id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_learning_statistics AFTER INSERT OR UPDATE OR DELETE ON "public".learning
+FOR EACH ROW EXECUTE FUNCTION "public".learning_statistics_trigger();
+
+CREATE FUNCTION "public".users_statistics_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM "public".user_topic_statistics WHERE user_id = OLD.id;
+    ELSIF OLD.correct_answers_number IS DISTINCT FROM NEW.correct_answers_number THEN
+        PERFORM "public".recount_learned_words_number(NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_users_statistics AFTER UPDATE OF correct_answers_number OR DELETE ON "public".users
+FOR EACH ROW EXECUTE FUNCTION "public".users_statistics_trigger();
+
+CREATE FUNCTION "public".words_statistics_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.topic_id = NEW.topic_id THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE "public".topics SET words_number = words_number - 1 WHERE id = OLD.topic_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE "public".topics SET words_number = words_number + 1 WHERE id = NEW.topic_id;
+    END IF;
+
+    -- Выученное слово переносится в счётчик новой темы
+    IF TG_OP = 'UPDATE' THEN
+        UPDATE "public".user_topic_statistics
+        SET learned_words_number = learned_words_number - 1
+        FROM "public".learning
+        WHERE learning.word_id = NEW.id
+          AND "public".is_word_learned(learning.user_id, learning.correct_answers_number)
+          AND user_topic_statistics.user_id = learning.user_id
+          AND user_topic_statistics.topic_id = OLD.topic_id;
+
+        PERFORM "public".change_learned_words_number(learning.user_id, NEW.id, 1)
+        FROM "public".learning
+        WHERE learning.word_id = NEW.id
+          AND "public".is_word_learned(learning.user_id, learning.correct_answers_number);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_words_statistics AFTER INSERT OR UPDATE OF topic_id OR DELETE ON "public".words
+FOR EACH ROW EXECUTE FUNCTION "public".words_statistics_trigger();
+
+-- Начальные значения счётчиков
+UPDATE "public".topics
+SET words_number = (SELECT COUNT(*) FROM "public".words WHERE words.topic_id = topics.id);
+
+INSERT INTO "public".user_topic_statistics (user_id, topic_id, learned_words_number)
+SELECT learning.user_id, words.topic_id, COUNT(*)
+FROM "public".learning
+JOIN "public".users ON users.id = learning.user_id
+JOIN "public".words ON words.id = learning.word_id
+WHERE learning.correct_answers_number >= users.correct_answers_number
+GROUP BY learning.user_id, words.topic_id;
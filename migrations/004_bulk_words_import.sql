@@ -0,0 +1,42 @@
+-- Массовая загрузка словаря (import_words.py).
+-- Счётчик topics.words_number при добавлении и удалении слов обновляется триггерами уровня оператора:
+-- одно обновление темы на запрос вместо обновления на каждое слово.
+-- Построчный триггер остаётся только для переноса слова в другую тему.
+
+DROP TRIGGER trg_words_statistics ON "public".words;
+
+CREATE TRIGGER trg_words_statistics AFTER UPDATE OF topic_id ON "public".words
+FOR EACH ROW EXECUTE FUNCTION "public".words_statistics_trigger();
+
+CREATE FUNCTION "public".words_number_insert_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE "public".topics SET words_number = topics.words_number + inserted.words_number
+    FROM (SELECT topic_id, COUNT(*) AS words_number FROM new_words GROUP BY topic_id) AS inserted
+    WHERE topics.id = inserted.topic_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION "public".words_number_delete_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE "public".topics SET words_number = topics.words_number - deleted.words_number
+    FROM (SELECT topic_id, COUNT(*) AS words_number FROM old_words GROUP BY topic_id) AS deleted
+    WHERE topics.id = deleted.topic_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_words_number_insert AFTER INSERT ON "public".words
+REFERENCING NEW TABLE AS new_words
+FOR EACH STATEMENT EXECUTE FUNCTION "public".words_number_insert_trigger();
+
+CREATE TRIGGER trg_words_number_delete AFTER DELETE ON "public".words
+REFERENCING OLD TABLE AS old_words
+FOR EACH STATEMENT EXECUTE FUNCTION "public".words_number_delete_trigger();
+
+-- Поиск уже загруженных слов темы при удалении дубликатов.
+-- Индекс по (topic_id, word) заменяет индекс по topic_id
+CREATE INDEX IF NOT EXISTS idx_words_topic_id_word ON "public".words ( topic_id, word );
+DROP INDEX IF EXISTS "public".idx_words_topic_id;
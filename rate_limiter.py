@@ -0,0 +1,148 @@
+import asyncio
+import bisect
+import itertools
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        # rate - токенов в секунду, capacity - наибольшее число запросов подряд
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        # До этого момента запросы не отправляются (retry_after из ответа 429)
+        self.blocked_until = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        # Через сколько секунд можно отправить следующий запрос
+        self.refill(now)
+        delay = max(self.blocked_until - now, 0.0)
+        if self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        return delay
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_idle(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class RateLimiter:
+    # Ограничение исходящих запросов к Telegram: общий лимит бота и лимит на каждый чат.
+    # Ожидающие запросы выпускаются по приоритету (меньше - раньше), при равном приоритете - по порядку.
+    # Запрос в чат, лимит которого исчерпан, не задерживает запросы в другие чаты
+    def __init__(self, rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0):
+        # Небольшой общий запас: за любую секунду уходит не больше rate запросов плюс запас
+        self.bucket = TokenBucket(rate, max(1.0, rate / 10))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+
+        # Отсортированный список (приоритет, порядковый номер, id чата, future)
+        self.waiters = []
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.dispatcher = None
+        self.cleaned_at = time.monotonic()
+
+        # Метрики
+        self.acquired = 0
+        self.throttled = 0
+        self.max_queue_size = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def get_chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def acquire(self, chat_id=None, priority: int = 0):
+        # chat_id=None - запрос учитывается только в общем лимите
+        enqueued_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self.waiters, (priority, next(self.counter), chat_id, future))
+        self.max_queue_size = max(self.max_queue_size, len(self.waiters))
+
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self.dispatch())
+        self.wakeup.set()
+
+        await future
+
+        wait_time = time.monotonic() - enqueued_at
+        self.acquired += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def pause(self, chat_id, retry_after: float):
+        # Telegram вернул 429: запросы в чат (или все запросы, если чат не указан) приостанавливаются
+        self.throttled += 1
+        bucket = self.bucket if chat_id is None else self.get_chat_bucket(chat_id)
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + retry_after)
+
+    async def dispatch(self):
+        while self.waiters:
+            self.wakeup.clear()
+            # Отменённые запросы больше не ждут
+            self.waiters = [waiter for waiter in self.waiters if not waiter[3].done()]
+            self.remove_idle_buckets()
+
+            now = time.monotonic()
+            delay = self.bucket.delay(now)
+            if delay == 0:
+                delay = None
+                for index, (_, _, chat_id, future) in enumerate(self.waiters):
+                    chat_delay = 0.0 if chat_id is None else self.get_chat_bucket(chat_id).delay(now)
+                    if chat_delay == 0:
+                        self.bucket.take()
+                        if chat_id is not None:
+                            self.chat_buckets[chat_id].take()
+                        del self.waiters[index]
+                        future.set_result(None)
+                        break
+                    delay = chat_delay if delay is None else min(delay, chat_delay)
+                else:
+                    if delay is not None:
+                        await self.wait(delay)
+                continue
+
+            await self.wait(delay)
+
+    async def wait(self, delay: float):
+        # Ожидание освобождения лимита или нового запроса
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def remove_idle_buckets(self):
+        now = time.monotonic()
+        if now - self.cleaned_at < 60:
+            return
+        self.cleaned_at = now
+
+        waiting_chats = {chat_id for _, _, chat_id, _ in self.waiters}
+        idle = [chat_id for chat_id, bucket in self.chat_buckets.items()
+                if chat_id not in waiting_chats and bucket.is_idle(now)]
+        for chat_id in idle:
+            del self.chat_buckets[chat_id]
+
+    def stats(self) -> dict:
+        return {
+            "queue_size": len(self.waiters),
+            "max_queue_size": self.max_queue_size,
+            "chats": len(self.chat_buckets),
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "wait_time_total": self.wait_time_total,
+            "wait_time_max": self.wait_time_max,
+        }
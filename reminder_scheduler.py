@@ -0,0 +1,163 @@
+import asyncio
+import datetime
+import heapq
+import time
+
+
+class ReminderScheduler:
+    # Очередь напоминаний по времени: куча (время напоминания, id пользователя).
+    # Пользователи загружаются из БД только при периодической сверке,
+    # между сверками время напоминания обновляют обработчики через schedule
+    def __init__(self, db, send_reminder, interval: int = 30, resync_interval: float = 600.0,
+                 concurrency: int = 10, batch_size: int = 500, max_attempts: int = 3, retry_delay: float = 60.0):
+        self.db = db
+        # send_reminder(user_id) возвращает None, если напоминание не отправлено
+        self.send_reminder = send_reminder
+        # Через сколько минут после последнего теста отправляется напоминание
+        self.interval = interval
+        # Как часто (в секундах) очередь сверяется с БД: изменения из других процессов и после перезапуска
+        self.resync_interval = resync_interval
+        self.batch_size = batch_size
+        # Неотправленное напоминание повторяется через retry_delay * номер попытки секунд,
+        # после max_attempts попыток (например, бот заблокирован пользователем) оно пропускается
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.attempts = {}
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+        self.heap = []
+        # Актуальное время напоминания пользователя: записи кучи с другим временем устарели
+        self.due = {}
+        # Изменения, сделанные во время сверки, применяются поверх загруженных из БД
+        self.resync_changes = None
+        self.resynced_at = None
+        self.wakeup = asyncio.Event()
+
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def schedule(self, user_id: int, last_repeat: datetime.datetime | None):
+        if last_repeat is None:
+            self.cancel(user_id)
+            return
+
+        self.attempts.pop(user_id, None)
+        self.schedule_at(user_id, last_repeat + datetime.timedelta(minutes=self.interval))
+
+    def schedule_at(self, user_id: int, due_at: datetime.datetime):
+        self.due[user_id] = due_at
+        if self.resync_changes is not None:
+            self.resync_changes[user_id] = due_at
+
+        heapq.heappush(self.heap, (due_at, user_id))
+        if self.heap[0] == (due_at, user_id):
+            # Напоминание раньше того, которого сейчас ждёт run
+            self.wakeup.set()
+
+        # Устаревших записей стало слишком много
+        if len(self.heap) > 2 * len(self.due) + 1000:
+            self.heap = [(due_at, user_id) for user_id, due_at in self.due.items()]
+            heapq.heapify(self.heap)
+
+    def cancel(self, user_id: int):
+        self.due.pop(user_id, None)
+        self.attempts.pop(user_id, None)
+        if self.resync_changes is not None:
+            self.resync_changes[user_id] = None
+
+    async def resync(self):
+        self.resync_changes = {}
+        try:
+            users = await self.db.get_users_waiting_reminder()
+            if users is None:
+                return
+
+            due = {user_id: last_repeat + datetime.timedelta(minutes=self.interval)
+                   for user_id, last_repeat in users}
+            # Повторные попытки сохраняют своё время, иначе напоминание отправилось бы сразу после сверки
+            for user_id in self.attempts:
+                if user_id in due and user_id in self.due:
+                    due[user_id] = self.due[user_id]
+            for user_id, due_at in self.resync_changes.items():
+                if due_at is None:
+                    due.pop(user_id, None)
+                else:
+                    due[user_id] = due_at
+
+            self.due = due
+            self.heap = [(due_at, user_id) for user_id, due_at in due.items()]
+            heapq.heapify(self.heap)
+        finally:
+            self.resync_changes = None
+            self.resynced_at = time.monotonic()
+
+    async def send_due(self):
+        now = datetime.datetime.now()
+        user_ids = []
+        while self.heap and self.heap[0][0] <= now:
+            due_at, user_id = heapq.heappop(self.heap)
+            if self.due.get(user_id) == due_at:
+                del self.due[user_id]
+                user_ids.append(user_id)
+
+        for i in range(0, len(user_ids), self.batch_size):
+            batch = user_ids[i:i + self.batch_size]
+            # Флаг отправки ставится одним запросом и только тем, кому напоминание действительно положено,
+            # поэтому несколько процессов не отправят одно напоминание дважды
+            claimed = await self.db.claim_reminders(batch, self.interval) or []
+            self.skipped += len(batch) - len(claimed)
+            await asyncio.gather(*(self.send(user_id) for user_id in claimed))
+
+    async def send(self, user_id: int):
+        async with self.semaphore:
+            try:
+                result = await self.send_reminder(user_id)
+            except Exception as error:
+                result = None
+                print("Ошибка при отправке напоминания.", error)
+
+        if result is not None:
+            self.sent += 1
+            self.attempts.pop(user_id, None)
+            return
+
+        self.failed += 1
+        attempts = self.attempts.pop(user_id, 0) + 1
+        if attempts >= self.max_attempts:
+            # Флаг отправки остаётся установленным до следующего теста пользователя
+            return
+        # claim_reminders уже установил флаг отправки: он снимается, чтобы напоминание можно было отправить снова
+        await self.db.set_is_reminder_send(user_id, False)
+        self.attempts[user_id] = attempts
+        self.schedule_at(user_id, datetime.datetime.now() + datetime.timedelta(seconds=self.retry_delay * attempts))
+
+    async def run(self):
+        while True:
+            try:
+                if self.resynced_at is None or time.monotonic() - self.resynced_at >= self.resync_interval:
+                    await self.resync()
+
+                self.wakeup.clear()
+                await self.send_due()
+
+                timeout = self.resync_interval - (time.monotonic() - self.resynced_at)
+                if self.heap:
+                    timeout = min(timeout, (self.heap[0][0] - datetime.datetime.now()).total_seconds())
+                await asyncio.wait_for(self.wakeup.wait(), max(timeout, 0.0))
+            except asyncio.TimeoutError:
+                pass
+            except Exception as error:
+                print("Ошибка в очереди напоминаний.", error)
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self.due),
+            "heap_size": len(self.heap),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retrying": len(self.attempts),
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,98 @@
+import time
+from collections import Counter
+
+import metrics
+from update import Update
+
+
+class Route:
+    __slots__ = ("name", "handler", "state_specific")
+
+    def __init__(self, name, handler, state_specific):
+        self.name = name
+        self.handler = handler
+        # Маршрут для конкретного состояния важнее маршрута для любого состояния
+        self.state_specific = state_specific
+
+
+class Router:
+    # Выбор обработчика обновления по ключу (вид обновления, состояние пользователя, текст/данные кнопки).
+    # Маршруты для любого состояния разворачиваются по всем состояниям при добавлении,
+    # поэтому обновление разбирается не более чем тремя поисками в словаре:
+    # точный текст или данные кнопки, префикс данных кнопки, обработчик состояния
+    MESSAGE = 'message'
+    CALLBACK = 'callback'
+    PREFIX_SEPARATORS = (' ', ':')
+
+    def __init__(self, states):
+        # None - состояние пользователя, которого ещё нет в БД
+        self.states = (*states, None)
+        self.routes = {}
+        self.counters = Counter()
+
+    def add(self, kind, handler, key=None, state=None, prefix=False, name=None):
+        # key=None - обработчик всех обновлений этого вида в состоянии state.
+        # state=None - маршрут действует в любом состоянии
+        if prefix:
+            key = ('prefix', key)
+        route = Route(name or handler.__name__, handler, state is not None)
+        for route_state in (self.states if state is None else (state,)):
+            existing = self.routes.get((kind, route_state, key))
+            if existing is None or not existing.state_specific or route.state_specific:
+                self.routes[(kind, route_state, key)] = route
+
+    def add_command(self, text, handler, state=None):
+        self.add(self.MESSAGE, handler, text, state)
+
+    def add_callback(self, data, handler, state=None):
+        self.add(self.CALLBACK, handler, data, state)
+
+    def add_callback_prefix(self, prefix, handler, state=None, name=None):
+        self.add(self.CALLBACK, handler, prefix, state, prefix=True, name=name)
+
+    def add_state(self, state, handler):
+        self.add(self.MESSAGE, handler, state=state)
+        self.add(self.CALLBACK, handler, state=state)
+
+    @classmethod
+    def get_prefix(cls, data: str) -> str | None:
+        for index, char in enumerate(data):
+            if char in cls.PREFIX_SEPARATORS:
+                return data[:index + 1]
+        return None
+
+    def resolve(self, update: Update, state) -> Route | None:
+        if update.is_callback:
+            kind, key = self.CALLBACK, update.callback_data
+        else:
+            kind, key = self.MESSAGE, update.text
+
+        routes = self.routes
+        route = routes.get((kind, state, key))
+        if route is None and kind == self.CALLBACK and key:
+            prefix = self.get_prefix(key)
+            if prefix is not None:
+                route = routes.get((kind, state, ('prefix', prefix)))
+        if route is None:
+            route = routes.get((kind, state, None))
+        return route
+
+    async def dispatch(self, update: Update, get_state):
+        # get_state(user_id) - корутина, состояние пользователя запрашивается один раз
+        route = self.resolve(update, await get_state(update.user_id))
+        if route is None:
+            self.counters['unmatched'] += 1
+            return
+        self.counters[route.name] += 1
+        started_at = time.perf_counter()
+        try:
+            await route.handler(update)
+        except Exception:
+            metrics.HANDLER_ERRORS.inc(route.name)
+            raise
+        finally:
+            metrics.HANDLER_SECONDS.observe(time.perf_counter() - started_at, route.name)
+
+    def stats(self) -> dict:
+        # Число обновлений по маршрутам, unmatched - обновления без обработчика
+        return dict(self.counters)
@@ -0,0 +1,118 @@
+import base64
+import binascii
+import random
+import struct
+import time
+
+# Данные кнопки ответа: префикс и base64 от (id теста, номер вопроса, номер варианта ответа)
+ANSWER_CALLBACK_PREFIX = 'a:'
+ANSWER_FORMAT = struct.Struct('>IIB')
+
+
+def encode_answer(session_id: int, question_index: int, option_index: int) -> str:
+    data = ANSWER_FORMAT.pack(session_id, question_index, option_index)
+    return ANSWER_CALLBACK_PREFIX + base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def decode_answer(callback_data: str | None) -> tuple[int, int, int] | None:
+    # None - данные не являются кнопкой ответа (например, кнопка из старой версии бота)
+    if not callback_data or not callback_data.startswith(ANSWER_CALLBACK_PREFIX):
+        return None
+    encoded = callback_data[len(ANSWER_CALLBACK_PREFIX):]
+    try:
+        data = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+        return ANSWER_FORMAT.unpack(data)
+    except (binascii.Error, struct.error, ValueError):
+        return None
+
+
+class Question:
+    def __init__(self, word_id, word, word_translation, usage_example, usage_example_translation,
+                 correct_answers_number, fake_translations):
+        self.word_id = word_id
+        self.word = word
+        self.word_translation = word_translation
+        self.usage_example = usage_example
+        self.usage_example_translation = usage_example_translation
+        # Количество правильных ответов из таблицы прогресса обучения (None - слово ещё не изучалось)
+        self.correct_answers_number = correct_answers_number
+
+        self.answers = [word_translation, *fake_translations]
+        random.shuffle(self.answers)
+        # Номер правильного варианта: ответ проверяется сравнением чисел
+        self.correct_option = self.answers.index(word_translation)
+
+
+class TestSession:
+    # Тест пользователя целиком в памяти: порядок вопросов, слова, варианты ответов и результаты
+    def __init__(self, user_id, questions):
+        self.user_id = user_id
+        # Отличает кнопки этого теста от кнопок прежних тестов пользователя
+        self.session_id = random.getrandbits(32)
+        self.questions = questions
+        random.shuffle(self.questions)
+        # None - вопрос без ответа, True/False - правильность ответа
+        self.results = [None] * len(questions)
+        # Число ответов каждого вида, обновляется при каждом ответе
+        self.counts = {True: 0, False: 0, None: len(questions)}
+        self.current = 0
+
+    def get_question(self) -> Question | None:
+        if self.current >= len(self.questions):
+            return None
+        return self.questions[self.current]
+
+    def answer(self, is_right: bool):
+        self.results[self.current] = is_right
+        self.counts[None] -= 1
+        self.counts[is_right] += 1
+        self.current += 1
+
+    def count_results(self) -> dict:
+        return dict(self.counts)
+
+
+class TestSessionCache:
+    def __init__(self, ttl: float):
+        # Время жизни теста в секундах с момента последнего обращения
+        self.ttl = ttl
+        self.sessions = {}
+        # Устаревшие тесты удаляются не чаще раза в минуту
+        self.cleanup_interval = min(ttl, 60.0)
+        self.cleaned_at = time.monotonic()
+
+    def get(self, user_id) -> TestSession | None:
+        item = self.sessions.get(user_id)
+        if item is None:
+            return None
+
+        session, expires_at = item
+        if expires_at < time.monotonic():
+            del self.sessions[user_id]
+            return None
+
+        self.sessions[user_id] = (session, time.monotonic() + self.ttl)
+        return session
+
+    def set(self, user_id, session: TestSession):
+        self.remove_expired()
+        self.sessions[user_id] = (session, time.monotonic() + self.ttl)
+
+    def pop(self, user_id) -> TestSession | None:
+        session = self.get(user_id)
+        self.sessions.pop(user_id, None)
+        return session
+
+    def remove_expired(self):
+        now = time.monotonic()
+        if now - self.cleaned_at < self.cleanup_interval:
+            return
+        self.cleaned_at = now
+
+        expired = [user_id for user_id, (_, expires_at) in self.sessions.items() if expires_at < now]
+        for user_id in expired:
+            del self.sessions[user_id]
+
+    def stats(self) -> dict:
+        # Тесты, которые сейчас проходятся (включая ещё не удалённые устаревшие)
+        return {"size": len(self.sessions)}
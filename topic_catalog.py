@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+
+# Префикс callback_data кнопок переключения страниц клавиатуры выбора темы
+TOPICS_PAGE_CALLBACK_PREFIX = 'topics_page:'
+
+
+class TopicCatalog:
+    # Список тем в памяти и готовая (сериализованная) разметка страниц клавиатуры выбора темы.
+    # load_topics возвращает список (id, title) всех тем
+    def __init__(self, load_topics, page_size: int = 10, max_age: float = 600.0):
+        self.load_topics = load_topics
+        self.page_size = page_size
+        # Через сколько секунд каталог перечитывается, даже если темы не менялись в этом процессе
+        self.max_age = max_age
+
+        self.topics = []
+        self.pages = []
+
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.max_age
+
+    def reload_if_stale(self):
+        if not self.is_stale():
+            return
+        with self.lock:
+            # Пока поток ждал блокировку, каталог мог перечитать другой поток
+            if self.is_stale():
+                self._load()
+
+    def _load(self):
+        # Вызывается под блокировкой
+        topics = self.load_topics()
+        if topics is None:
+            # Ошибка при загрузке: остаётся прежний каталог, он будет перечитан при следующем обращении
+            return
+        pages_number = max(1, (len(topics) + self.page_size - 1) // self.page_size)
+
+        pages = []
+        for page in range(pages_number):
+            page_topics = topics[page * self.page_size:(page + 1) * self.page_size]
+            inline_keyboard = [{"text": f"{title}", "callback_data": f"{topic_id}"}
+                               for topic_id, title in page_topics]
+            rows = [inline_keyboard[i:i + 2] for i in range(0, len(inline_keyboard), 2)]
+
+            navigation = []
+            if page > 0:
+                navigation.append({"text": "◀ Назад", "callback_data": f"{TOPICS_PAGE_CALLBACK_PREFIX}{page - 1}"})
+            if page < pages_number - 1:
+                navigation.append({"text": "Вперёд ▶", "callback_data": f"{TOPICS_PAGE_CALLBACK_PREFIX}{page + 1}"})
+            if navigation:
+                rows.append(navigation)
+
+            pages.append(json.dumps({"inline_keyboard": rows}))
+
+        self.topics = topics
+        self.pages = pages
+        self.loaded_at = time.monotonic()
+
+    def get_topics(self) -> list[tuple[int, str]]:
+        self.reload_if_stale()
+        return self.topics
+
+    def get_page_markup(self, page: int = 0) -> str | None:
+        self.reload_if_stale()
+        if not self.pages:
+            return None
+        page = min(max(page, 0), len(self.pages) - 1)
+        return self.pages[page]
@@ -0,0 +1,39 @@
+class Update:
+    # Обновление Telegram, разобранное один раз при получении.
+    # Обработчики получают его аргументом и не зависят от контекста запроса Flask
+    __slots__ = ("update_id", "user_id", "chat_id", "message_id", "text", "callback_data", "callback_query_id")
+
+    def __init__(self, update_id, user_id, chat_id, message_id=None, text=None, callback_data=None,
+                 callback_query_id=None):
+        self.update_id = update_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        # Текст сообщения (None для нажатия inline-кнопки)
+        self.text = text
+        # Данные нажатой inline-кнопки и id запроса для answerCallbackQuery (None для сообщения)
+        self.callback_data = callback_data
+        self.callback_query_id = callback_query_id
+
+    @property
+    def is_callback(self) -> bool:
+        return self.callback_query_id is not None
+
+    @classmethod
+    def parse(cls, update: dict):
+        # Возвращает None для обновлений, которые бот не обрабатывает.
+        # KeyError/TypeError - обновление без обязательных полей
+        message = update.get('message')
+        if message:
+            return cls(update['update_id'], message['from']['id'], message['chat']['id'],
+                       message_id=message.get('message_id'), text=message.get('text'))
+
+        callback_query = update.get('callback_query')
+        if callback_query:
+            # Сообщение с кнопкой может отсутствовать, если оно слишком старое
+            message = callback_query.get('message') or {}
+            chat_id = (message.get('chat') or {}).get('id', callback_query['from']['id'])
+            return cls(update['update_id'], callback_query['from']['id'], chat_id,
+                       message_id=message.get('message_id'), callback_data=callback_query.get('data'),
+                       callback_query_id=callback_query['id'])
+        return None
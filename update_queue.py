@@ -0,0 +1,117 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+
+class UpdateQueue:
+    def __init__(self, process_update, workers_number=8, max_size=1000, seen_updates_size=10000):
+        self.process_update = process_update
+        self.workers_number = workers_number
+        self.max_size = max_size
+        self.seen_updates_size = seen_updates_size
+
+        # Очередь обновлений каждого пользователя и очередь пользователей, готовых к обработке.
+        # Пользователь находится в ready не более одного раза и обрабатывается одним воркером,
+        # поэтому его обновления выполняются строго по порядку
+        self.pending = {}
+        self.ready = asyncio.Queue()
+        self.seen_updates = OrderedDict()
+        self.workers = []
+        # Установлено, когда в очереди нет необработанных обновлений
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+        # Метрики
+        self.size = 0
+        self.max_size_reached = 0
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def start(self):
+        for _ in range(self.workers_number):
+            self.workers.append(asyncio.create_task(self.worker()))
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    async def join(self):
+        # Ждёт обработки всех принятых обновлений
+        await self.idle.wait()
+
+    async def submit(self, update, user_id) -> bool:
+        # Возвращает False, если обновление не принято из-за переполнения очереди
+        self.received += 1
+
+        update_id = update.update_id
+        if update_id in self.seen_updates:
+            self.duplicates += 1
+            return True
+
+        if self.size >= self.max_size:
+            self.rejected += 1
+            return False
+
+        self.seen_updates[update_id] = None
+        if len(self.seen_updates) > self.seen_updates_size:
+            self.seen_updates.popitem(last=False)
+
+        self.size += 1
+        self.idle.clear()
+        self.max_size_reached = max(self.max_size_reached, self.size)
+
+        user_updates = self.pending.get(user_id)
+        if user_updates is None:
+            self.pending[user_id] = deque([(update, time.monotonic())])
+            self.ready.put_nowait(user_id)
+        else:
+            user_updates.append((update, time.monotonic()))
+        return True
+
+    async def worker(self):
+        while True:
+            user_id = await self.ready.get()
+            user_updates = self.pending[user_id]
+            update, enqueued_at = user_updates.popleft()
+
+            wait_time = time.monotonic() - enqueued_at
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+            try:
+                await self.process_update(update)
+                self.processed += 1
+            except Exception as error:
+                self.failed += 1
+                print("Ошибка при обработке обновления.", error)
+            finally:
+                self.size -= 1
+                if not self.size:
+                    self.idle.set()
+
+            if user_updates:
+                self.ready.put_nowait(user_id)
+            else:
+                del self.pending[user_id]
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "max_size": self.max_size,
+            "max_size_reached": self.max_size_reached,
+            "users": len(self.pending),
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "wait_time_total": self.wait_time_total,
+            "wait_time_max": self.wait_time_max,
+        }
@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class UserCache:
+    # Кеш строк пользователей (состояние бота и настройки теста) с вытеснением давно не используемых (LRU).
+    # Несколько процессов бота согласуют кеш через Redis: об изменении пользователя рассылается сообщение,
+    # и остальные процессы удаляют его запись у себя
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, redis_url: str | None = None,
+                 channel: str = 'user_cache'):
+        self.max_size = max_size
+        # Запись перечитывается из БД не реже, чем раз в ttl секунд, даже если сообщение об изменении потерялось
+        self.ttl = ttl
+        self.users = OrderedDict()
+        # Увеличивается при каждом изменении: строка, прочитанная из БД до изменения, в кеш не попадает
+        self.version = 0
+        self.lock = threading.Lock()
+
+        self.channel = channel
+        self.instance_id = uuid.uuid4().hex
+        self.redis = None
+        self.pubsub_thread = None
+        if redis_url:
+            self.connect(redis_url)
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def connect(self, redis_url: str):
+        if redis is None:
+            print("Ошибка при подключении кеша пользователей к Redis: пакет redis не установлен.")
+            return
+        try:
+            self.redis = redis.Redis.from_url(redis_url)
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.channel: self.on_message})
+            self.pubsub_thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except redis.RedisError as error:
+            self.redis = None
+            print("Ошибка при подключении кеша пользователей к Redis.", error)
+
+    def on_message(self, message):
+        instance_id, user_id = message['data'].decode().split(':')
+        if instance_id != self.instance_id:
+            with self.lock:
+                self.version += 1
+                self.users.pop(int(user_id), None)
+
+    def publish(self, user_id: int):
+        if self.redis is None:
+            return
+        try:
+            self.redis.publish(self.channel, f"{self.instance_id}:{user_id}")
+        except redis.RedisError as error:
+            print("Ошибка при отправке изменения пользователя в Redis.", error)
+
+    def get_version(self) -> int:
+        return self.version
+
+    def get(self, user_id: int) -> dict | None:
+        with self.lock:
+            item = self.users.get(user_id)
+            if item is None or item[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self.users.move_to_end(user_id)
+            self.hits += 1
+            return dict(item[0])
+
+    def set(self, user_id: int, user: dict, version: int):
+        # version - значение get_version() до чтения строки из БД
+        with self.lock:
+            if version != self.version:
+                return
+            self.users[user_id] = (dict(user), time.monotonic() + self.ttl)
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.max_size:
+                self.users.popitem(last=False)
+                self.evictions += 1
+
+    def has_value(self, user_id: int, field: str, value) -> bool:
+        # True - в кеше уже это значение, запись в БД можно пропустить
+        with self.lock:
+            item = self.users.get(user_id)
+            if item is None or item[1] < time.monotonic() or item[0].get(field) != value:
+                return False
+            self.coalesced += 1
+            return True
+
+    def put(self, user_id: int, user: dict):
+        # Вызывается после записи в БД, когда известна вся строка пользователя
+        with self.lock:
+            self.version += 1
+            self.users[user_id] = (dict(user), time.monotonic() + self.ttl)
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.max_size:
+                self.users.popitem(last=False)
+                self.evictions += 1
+        self.publish(user_id)
+
+    def invalidate(self, user_id: int):
+        with self.lock:
+            self.version += 1
+            self.users.pop(user_id, None)
+        self.publish(user_id)
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.users.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.users),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "shared": self.redis is not None,
+        }
@@ -0,0 +1,17 @@
+class UserContext:
+    # Данные пользователя для обработчика, загруженные одним запросом.
+    # learned_word_number и word_number_in_topic загружаются только по запросу
+    def __init__(self, user_id, state=None, topic_id=None, topic_title=None, topic_description=None,
+                 questions_number=None, correct_answers_number=None, last_repeat=None, is_reminder_send=None,
+                 learned_word_number=None, word_number_in_topic=None):
+        self.user_id = user_id
+        self.state = state
+        self.topic_id = topic_id
+        self.topic_title = topic_title
+        self.topic_description = topic_description
+        self.questions_number = questions_number
+        self.correct_answers_number = correct_answers_number
+        self.last_repeat = last_repeat
+        self.is_reminder_send = is_reminder_send
+        self.learned_word_number = learned_word_number
+        self.word_number_in_topic = word_number_in_topic